@@ -481,6 +481,19 @@ function interpretStatistics(stats, variable) {
                 <li><strong>Valeur maximale</strong> (${max}): Le jeu avec le plus d'avis ${variable}.</li>
             </ul>
         `;
+        const fit = stats.goodness_of_fit;
+        if (fit && fit.fits.length) {
+            const labels = { normal: 'normale', lognormal: 'log-normale', exponential: 'exponentielle' };
+            interpretationElement.innerHTML += `
+            <p><strong>Loi la plus proche</strong>: ${labels[fit.best] || fit.best} (KS = ${fit.fits[0].ks.toFixed(3)}, Anderson-Darling = ${fit.fits[0].anderson_darling.toFixed(1)}).</p>
+        `;
+            const tail = fit.power_law_tail;
+            if (tail) {
+                interpretationElement.innerHTML += `
+            <p><strong>Queue de distribution</strong> (${(tail.params.tail_fraction * 100).toFixed(0)} % des jeux au-delà de ${tail.params.xmin.toFixed(0)}): loi de puissance d'exposant ${tail.params.alpha.toFixed(2)} (KS = ${tail.ks.toFixed(3)}).</p>
+        `;
+            }
+        }
     }
 }
 
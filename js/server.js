@@ -35,6 +35,23 @@ MongoClient.connect(url)
     });
 
 
+// Incrémente la version des données de 'games' après chaque écriture:
+// les services Python s'en servent pour invalider leurs réponses en cache (ETag).
+// L'écriture a déjà réussi: un échec ici est journalisé sans faire échouer la requête
+// (un client qui réessaierait un POST créerait un doublon).
+async function bumpDataVersion() {
+    try {
+        await db.collection('data_versions').updateOne(
+            { _id: 'games' },
+            { $inc: { version: 1 }, $currentDate: { updated_at: true } },
+            { upsert: true }
+        );
+    } catch (error) {
+        console.error('Error bumping data version:', error);
+    }
+}
+
+
 // Route pour récupérer tous les documents de la collection 'games' (GET)
 app.get('/games', async (req, res) => {
     try {
@@ -127,6 +144,7 @@ app.post('/games', async (req, res) => {
         
         console.log('Creating new game:', newGame);
         const result = await db.collection('games').insertOne(newGame);
+        await bumpDataVersion();
         
         res.status(201).json({ 
             message: 'Jeu créé avec succès', 
@@ -172,6 +190,7 @@ app.put('/games/:id', async (req, res) => {
         if (result.matchedCount === 0) {
             return res.status(404).json({ error: 'Jeu non trouvé' });
         }
+        await bumpDataVersion();
         
         res.status(200).json({ 
             message: 'Jeu mis à jour avec succès',
@@ -200,6 +219,7 @@ app.delete('/games/:id', async (req, res) => {
         if (result.deletedCount === 0) {
             return res.status(404).json({ error: 'Jeu non trouvé' });
         }
+        await bumpDataVersion();
         
         res.status(200).json({ message: 'Jeu supprimé avec succès' });
     } catch (error) {
@@ -291,7 +311,21 @@ app.get('/statistics', async (req, res) => {
         const pythonServiceUrl = 'http://localhost:5001/statistics';
         console.log(`Obtention des statistiques pour la variable: ${variable}`);
 
-        const response = await fetch(pythonServiceUrl);
+        // Relayer la validation conditionnelle: le service Python répond 304 si les données n'ont pas changé
+        const headers = {};
+        if (req.headers['if-none-match']) {
+            headers['If-None-Match'] = req.headers['if-none-match'];
+        }
+        const response = await fetch(pythonServiceUrl, { headers });
+        const etag = response.headers.get('etag');
+        if (etag) {
+            res.set('ETag', etag);
+            res.set('Cache-Control', response.headers.get('cache-control') || 'no-cache');
+        }
+        if (response.status === 304) {
+            console.log(`Statistics not modified for ${variable}`);
+            return res.status(304).end();
+        }
         if (!response.ok) {
             const errorText = await response.text();
             console.error('Erreur du service Python:', errorText);
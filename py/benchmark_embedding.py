@@ -0,0 +1,88 @@
+#benchmark_embedding.py
+"""
+Benchmark avant/après du saut vers le service d'embedding.
+
+Démarre le vrai `embedding_api_service` dans un thread avec un modèle factice
+(aucun téléchargement), puis compare:
+  - avant : requests.post + JSON, nouvelle connexion à chaque appel
+  - après : EmbeddingClient (keep-alive) + float32 brut, et msgpack si installé
+
+Usage: python py/benchmark_embedding.py [--requests 500]
+"""
+import argparse
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+
+from local_standins import StubEmbeddingModel, QuietRequestHandler
+from embedding_client import EmbeddingClient
+from embedding_wire import BINARY_MIMETYPE, MSGPACK_MIMETYPE, msgpack
+
+
+def start_stub_service():
+    """Importe le service d'embedding avec le modèle factice et le sert sur un port libre"""
+    sys.modules['sentence_transformers'] = types.SimpleNamespace(SentenceTransformer=StubEmbeddingModel)
+    import embedding_api_service
+
+    server = make_server('127.0.0.1', 0, embedding_api_service.app, threaded=True,
+                         request_handler=QuietRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://127.0.0.1:{server.server_port}/embed'
+
+
+def embed_before(url, text):
+    """Chemin historique de get_embedding"""
+    response = requests.post(url, json={'text': text}, timeout=10)
+    return response.json().get('embedding')
+
+
+def run(label, call, n_requests):
+    # Échauffement (connexion, caches Python)
+    for i in range(10):
+        call(f'warm-up {i}')
+
+    latencies = np.empty(n_requests)
+    for i in range(n_requests):
+        start = time.perf_counter()
+        embedding = call(f'Half-Life {i} Valve')
+        latencies[i] = (time.perf_counter() - start) * 1000
+        assert embedding is not None and len(embedding) == 384
+
+    print(f"{label:<28} moy={latencies.mean():6.3f} ms  p50={np.percentile(latencies, 50):6.3f} ms  "
+          f"p95={np.percentile(latencies, 95):6.3f} ms  p99={np.percentile(latencies, 99):6.3f} ms")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du service d'embedding")
+    parser.add_argument('--requests', type=int, default=500, help="Nombre d'appels par variante")
+    args = parser.parse_args()
+
+    server, url = start_stub_service()
+    print(f"Service d'embedding factice sur {url}, {args.requests} appels par variante\n")
+
+    try:
+        before = run('avant (JSON, sans keep-alive)', lambda text: embed_before(url, text), args.requests)
+
+        binary_client = EmbeddingClient(url=url, accept=BINARY_MIMETYPE)
+        after = run('après (float32, keep-alive)', lambda text: binary_client.embed(text).tolist(), args.requests)
+        binary_client.close()
+
+        if msgpack is not None:
+            msgpack_client = EmbeddingClient(url=url, accept=MSGPACK_MIMETYPE)
+            run('après (msgpack, keep-alive)', lambda text: msgpack_client.embed(text).tolist(), args.requests)
+            msgpack_client.close()
+
+        print(f"\nGain médian: {np.median(before) / np.median(after):.2f}x")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+#data_versions.py
+"""
+Compteur de version des données, par collection (collection `data_versions`).
+
+Chaque écrivain l'incrémente après ses écritures; les services Flask s'en
+servent pour invalider leurs réponses en cache (voir http_cache.DataVersion).
+Module sans dépendance à Flask: les scripts hors ligne l'importent directement.
+"""
+
+from pymongo.errors import DuplicateKeyError
+
+VERSION_COLLECTION_NAME = 'data_versions'
+
+
+def bump_data_version(collection, event_time=None):
+    """
+    Incrémente le compteur de version de `collection`. À appeler après toute
+    écriture sur la collection, mises à jour en place comprises: le nombre
+    de documents et le plus grand `_id` ne les voient pas.
+
+    Avec `event_time` (clusterTime d'un événement de change stream),
+    l'incrément n'a lieu qu'une fois par événement, quel que soit le nombre
+    de processus qui le surveillent: le compteur garde l'heure du dernier
+    événement compté et ignore les événements antérieurs ou identiques.
+    """
+    versions = collection.database[VERSION_COLLECTION_NAME]
+    if event_time is None:
+        versions.update_one(
+            {'_id': collection.name},
+            {'$inc': {'version': 1}, '$currentDate': {'updated_at': True}},
+            upsert=True
+        )
+        return
+    try:
+        versions.update_one(
+            {'_id': collection.name, 'last_event_time': {'$not': {'$gte': event_time}}},
+            {'$inc': {'version': 1}, '$set': {'last_event_time': event_time},
+             '$currentDate': {'updated_at': True}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Le document existe et l'événement est déjà compté par un autre processus
+        pass
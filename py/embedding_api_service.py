@@ -1,10 +1,12 @@
 #embedding_api_service.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from sentence_transformers import SentenceTransformer
 import sys
+from embedding_wire import supported_mimetypes, encode_embedding, encode_embeddings, JSON_MIMETYPE
 
 app = Flask(__name__)
 MODEL_NAME = "all-MiniLM-L6-v2"
+MAX_BATCH_TEXTS = 64
 
 try:
     print("Chargement du modèle d'embeddings...")
@@ -14,23 +16,40 @@ except Exception as e:
     print(f"Erreur lors du chargement du modèle: {e}")
     sys.exit(1)
 
+def warm_up():
+    """
+    Inférence d'échauffement, appelée par le lanceur dans chaque worker avant
+    qu'il n'accepte du trafic (initialise les pools de threads du modèle).
+    """
+    model.encode("warm-up")
+
+
 @app.route('/embed', methods=['POST'])
 def embed_text():
     """
     Route API qui prend un texte en entrée et retourne son vecteur d'embedding.
+    Le format de la réponse est négocié via l'en-tête Accept (JSON par défaut,
+    float32 brut ou msgpack pour les clients Python).
+    Avec 'texts' (liste) au lieu de 'text', tous les textes sont encodés en un
+    seul appel au modèle et la réponse est une matrice (une ligne par texte).
     """
     data = request.get_json()
-    if not data or 'text' not in data:
+    if not data or ('text' not in data and 'texts' not in data):
         return jsonify({'error': 'Aucun texte fourni.'}), 400
-    text_to_embed = data['text']
+    texts = data.get('texts')
+    if texts is not None:
+        if not isinstance(texts, list) or not texts or not all(isinstance(t, str) for t in texts):
+            return jsonify({'error': "'texts' doit être une liste non vide de chaînes."}), 400
+        if len(texts) > MAX_BATCH_TEXTS:
+            return jsonify({'error': f'Trop de textes ({len(texts)}, maximum {MAX_BATCH_TEXTS}).'}), 400
 
     try:
-        embedding = model.encode(text_to_embed)
-
-        return jsonify({
-            'embedding': embedding.tolist(),
-            'dimension': len(embedding)
-        }), 200
+        mimetype = request.accept_mimetypes.best_match(supported_mimetypes(), default=JSON_MIMETYPE)
+        if texts is not None:
+            body, headers = encode_embeddings(model.encode(texts, batch_size=len(texts)), mimetype)
+        else:
+            body, headers = encode_embedding(model.encode(data['text']), mimetype)
+        return Response(body, status=200, mimetype=mimetype, headers=headers)
     
     except Exception as e:
         print(f"Erreur lors de la génération de l'embedding: {e}")
@@ -0,0 +1,159 @@
+#embedding_client.py
+"""
+Client HTTP du service d'embedding utilisé par les services Python.
+
+Une session `requests` unique garde les connexions ouvertes (keep-alive),
+rejoue les erreurs transitoires et coupe les appels pendant un temps de
+refroidissement lorsque le service d'embedding est indisponible
+(disjoncteur), pour que les recherches basculent immédiatement sur le
+fallback par nom au lieu d'attendre le timeout à chaque requête.
+"""
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from embedding_wire import decode_embedding, decode_embeddings, BINARY_MIMETYPE, JSON_MIMETYPE, DIMENSION_HEADER
+
+EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL", "http://localhost:5000/embed")
+# Délais courts: un service bloqué doit ouvrir le disjoncteur en quelques secondes
+CONNECT_TIMEOUT = float(os.getenv("EMBEDDING_CONNECT_TIMEOUT", "0.5"))
+READ_TIMEOUT = float(os.getenv("EMBEDDING_READ_TIMEOUT", "2"))
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur simple: après `failure_threshold` échecs consécutifs, le circuit
+    s'ouvre pendant `reset_timeout` secondes. Passé ce délai, un seul appel
+    d'essai est autorisé (semi-ouvert) avant de refermer ou de rouvrir le circuit.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow_request(self):
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class EmbeddingClient:
+    """Client keep-alive du service d'embedding (format binaire float32 par défaut)"""
+
+    def __init__(self, url=EMBEDDING_SERVICE_URL, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=2,
+                 pool_maxsize=10, accept=BINARY_MIMETYPE, breaker=None):
+        self.url = url
+        self.timeout = timeout
+        self.accept = accept
+        self.breaker = breaker or CircuitBreaker()
+
+        # Seuls les échecs de connexion et les 502/503/504 sont rejoués: la requête
+        # n'a pas été traitée. Un délai de lecture dépassé n'est pas rejoué (POST).
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            backoff_factor=0.1,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['POST']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _post(self, payload):
+        """Appel protégé par le disjoncteur; retourne la réponse 2xx ou None"""
+        if not self.breaker.allow_request():
+            print("Service d'embedding indisponible (circuit ouvert), appel ignoré")
+            return None
+
+        try:
+            response = self.session.post(
+                self.url,
+                json=payload,
+                headers={'Accept': f'{self.accept}, {JSON_MIMETYPE};q=0.5'},
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            print(f"Erreur lors de l'obtention de l'embedding: {e}")
+            return None
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            return None
+        # Une erreur 4xx vient de la requête, pas d'une panne du service
+        self.breaker.record_success()
+        if not response.ok:
+            return None
+        return response
+
+    def embed(self, text):
+        """
+        Retourne l'embedding de `text` sous forme de tableau numpy float32,
+        ou None si le service est indisponible ou si le circuit est ouvert.
+        """
+        response = self._post({'text': text})
+        if response is None:
+            return None
+        return decode_embedding(response.content, response.headers.get('Content-Type'))
+
+    def embed_many(self, texts):
+        """
+        Embeddings de plusieurs textes en un seul appel (matrice float32, une
+        ligne par texte), ou None si le service est indisponible.
+        """
+        response = self._post({'texts': list(texts)})
+        if response is None:
+            return None
+        matrix = decode_embeddings(
+            response.content,
+            response.headers.get('Content-Type'),
+            response.headers.get(DIMENSION_HEADER)
+        )
+        if matrix is None or len(matrix) != len(texts):
+            return None
+        return matrix
+
+    def close(self):
+        self.session.close()
@@ -3,6 +3,9 @@ from dotenv import load_dotenv
 from pymongo import MongoClient
 import pymongo
 from sentence_transformers import SentenceTransformer
+from query_profiler import profiled_find
+from theme_clustering import load_theme_model, add_to_cluster_sizes, THEME_FIELD
+from data_versions import bump_data_version
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -10,6 +13,9 @@ MONGO_URI = os.getenv("MONGODB_URI")
 DB_NAME = 'steam_data'
 COLLECTION_NAME = 'games'
 EMBEDDING_FIELD = 'combined_embedding' # Nouveau champ pour stocker les embeddings dans MongoDB
+# Marqueur scalaire écrit avec l'embedding: indexable ({embedding_model: 1}), contrairement
+# au tableau de flottants, pour retrouver les documents sans embedding sans parcourir la collection
+EMBEDDING_MODEL_FIELD = 'embedding_model'
 FIELDS_TO_EMBED = ['name', 'developer'] # Champs à utiliser pour générer les embeddings
 
 # Modèle de génération d'embeddings
@@ -41,14 +47,22 @@ def generate_embeddings():
         print(f"Erreur lors de la connexion à MongoDB: {e}")
         return
     
-    # Trouver les documents sans embeddings
+    # Marquer les documents embarqués avant l'introduction du marqueur
+    backfill = collection.update_many(
+        {EMBEDDING_MODEL_FIELD: {"$exists": False}, EMBEDDING_FIELD: {"$exists": True}},
+        {'$set': {EMBEDDING_MODEL_FIELD: MODEL_NAME}}
+    )
+    if backfill.modified_count:
+        print(f"Marqueur '{EMBEDDING_MODEL_FIELD}' ajouté à {backfill.modified_count} documents déjà embarqués.")
+
+    # Trouver les documents sans embeddings (servi par l'index sur le marqueur)
     query = {
-        EMBEDDING_FIELD: {"$exists": False}, 
+        EMBEDDING_MODEL_FIELD: {"$exists": False}, 
         'name': {'$exists': True, '$ne': ''}, # Assurer que le champ 'name' existe et n'est pas vide
         'developer': {'$exists': True, '$ne': ''} # Assurer que le champ 'developer' existe et n'est pas vide
     }
     projection = {field: 1 for field in FIELDS_TO_EMBED}
-    documents_to_update = list(collection.find(query, projection))
+    documents_to_update = profiled_find(collection, query, projection, label='embedding_generation.missing_embeddings')
     if not documents_to_update:
         print("Tous les documents ont déjà des embeddings.")
         client.close()
@@ -62,9 +76,14 @@ def generate_embeddings():
         texts_to_embed.append(combined_text)
     embeddings = model.encode(texts_to_embed, show_progress_bar=True)
 
+    # Affecter les nouveaux jeux à un thème si un modèle thématique a déjà été entraîné
+    theme_model = load_theme_model(db)
+    themes = theme_model.assign(embeddings) if theme_model is not None else None
+
     # Mettre à jour les documents avec les nouveaux embeddings dans MongoDB
     print("Mise à jour des documents avec les nouveaux embeddings...")
     update_count = 0
+    assigned_themes = []  # thèmes des documents effectivement écrits
     batch_size = 1000  # Taille du lot pour les mises à jour en masse (pour éviter les timeouts)
     
     for i in range(0, len(documents_to_update), batch_size):
@@ -72,12 +91,15 @@ def generate_embeddings():
         batch_embeddings = embeddings[i:i + batch_size]
         
         updates = []
-        for doc, embedding in zip(batch_docs, batch_embeddings):
+        for j, (doc, embedding) in enumerate(zip(batch_docs, batch_embeddings)):
             update_doc = {
                 '$set': {
-                    EMBEDDING_FIELD: embedding.tolist()  # Convertir le tableau numpy en liste pour MongoDB
+                    EMBEDDING_FIELD: embedding.tolist(),  # Convertir le tableau numpy en liste pour MongoDB
+                    EMBEDDING_MODEL_FIELD: MODEL_NAME
                 }
             }
+            if themes is not None:
+                update_doc['$set'][THEME_FIELD] = int(themes[i + j])
             updates.append(
                 pymongo.UpdateOne(
                     {'_id': doc['_id']}, 
@@ -89,11 +111,18 @@ def generate_embeddings():
             try:
                 collection.bulk_write(updates)
                 update_count += len(updates)
+                if themes is not None:
+                    assigned_themes.extend(themes[i:i + len(updates)])
                 print(f"Batch {i//batch_size + 1}: {update_count}/{len(documents_to_update)} documents mis à jour")
             except Exception as e:
                 print(f"Erreur lors de la mise à jour du batch {i//batch_size + 1}: {e}")
     
     print(f"Mise à jour terminée. {update_count} documents mis à jour avec des embeddings.")
+    if assigned_themes:
+        add_to_cluster_sizes(db, assigned_themes, theme_model.n_clusters)
+    if update_count:
+        # Invalide les réponses mises en cache (ETag) des services
+        bump_data_version(collection)
 
     # Fermer la connexion à MongoDB
     client.close()
@@ -0,0 +1,117 @@
+#embedding_wire.py
+"""
+Formats d'échange des vecteurs d'embedding entre le service d'embedding
+et ses clients Python.
+
+Trois représentations sont négociées via l'en-tête HTTP `Accept`:
+  - application/json          : {'embedding': [...], 'dimension': n} (défaut, client Node)
+  - application/octet-stream  : float32 little-endian brut, dimension dans X-Embedding-Dimension
+  - application/x-msgpack     : {'embedding': <bytes float32 LE>, 'dimension': n} (si msgpack est installé)
+
+Un lot de textes donne une matrice n x d: clé 'embeddings' (liste de listes en
+JSON), lignes float32 concaténées en binaire et en msgpack, avec 'count'.
+"""
+import json
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # msgpack est optionnel
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+BINARY_MIMETYPE = 'application/octet-stream'
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+DIMENSION_HEADER = 'X-Embedding-Dimension'
+COUNT_HEADER = 'X-Embedding-Count'
+
+# Le dtype est fixé explicitement pour ne pas dépendre de l'endianness de la machine
+WIRE_DTYPE = np.dtype('<f4')
+
+
+def supported_mimetypes():
+    """Types proposés par le serveur, JSON en premier pour rester le choix par défaut"""
+    mimetypes = [JSON_MIMETYPE, BINARY_MIMETYPE]
+    if msgpack is not None:
+        mimetypes.append(MSGPACK_MIMETYPE)
+    return mimetypes
+
+
+def encode_embedding(embedding, mimetype):
+    """
+    Sérialise un vecteur d'embedding dans le format demandé.
+    Retourne le corps de la réponse et les en-têtes à ajouter.
+    """
+    vector = np.asarray(embedding, dtype=WIRE_DTYPE)
+    headers = {DIMENSION_HEADER: str(vector.shape[-1])}
+
+    if mimetype == BINARY_MIMETYPE:
+        return vector.tobytes(), headers
+    if mimetype == MSGPACK_MIMETYPE and msgpack is not None:
+        payload = {'embedding': vector.tobytes(), 'dimension': int(vector.shape[-1])}
+        return msgpack.packb(payload, use_bin_type=True), headers
+
+    payload = {'embedding': vector.tolist(), 'dimension': int(vector.shape[-1])}
+    return json.dumps(payload), headers
+
+
+def encode_embeddings(embeddings, mimetype):
+    """
+    Sérialise une matrice d'embeddings (une ligne par texte) dans le format demandé.
+    Retourne le corps de la réponse et les en-têtes à ajouter.
+    """
+    matrix = np.atleast_2d(np.asarray(embeddings, dtype=WIRE_DTYPE))
+    count, dimension = matrix.shape
+    headers = {DIMENSION_HEADER: str(dimension), COUNT_HEADER: str(count)}
+
+    if mimetype == BINARY_MIMETYPE:
+        return matrix.tobytes(), headers
+    if mimetype == MSGPACK_MIMETYPE and msgpack is not None:
+        payload = {'embeddings': matrix.tobytes(), 'dimension': dimension, 'count': count}
+        return msgpack.packb(payload, use_bin_type=True), headers
+
+    payload = {'embeddings': matrix.tolist(), 'dimension': dimension, 'count': count}
+    return json.dumps(payload), headers
+
+
+def decode_embedding(body, mimetype):
+    """
+    Désérialise le corps d'une réponse /embed en tableau numpy float32.
+    Retourne None si le format n'est pas reconnu.
+    """
+    mimetype = (mimetype or '').split(';')[0].strip()
+
+    if mimetype == BINARY_MIMETYPE:
+        return np.frombuffer(body, dtype=WIRE_DTYPE)
+    if mimetype == MSGPACK_MIMETYPE and msgpack is not None:
+        payload = msgpack.unpackb(body, raw=False)
+        return np.frombuffer(payload['embedding'], dtype=WIRE_DTYPE)
+    if mimetype == JSON_MIMETYPE:
+        payload = json.loads(body)
+        embedding = payload.get('embedding')
+        return np.asarray(embedding, dtype=WIRE_DTYPE) if embedding is not None else None
+    return None
+
+
+def decode_embeddings(body, mimetype, dimension=None):
+    """
+    Désérialise le corps d'une réponse /embed par lot en matrice float32 (n x d).
+    `dimension` (en-tête X-Embedding-Dimension) est requise pour le format binaire.
+    Retourne None si le format n'est pas reconnu.
+    """
+    mimetype = (mimetype or '').split(';')[0].strip()
+
+    if mimetype == BINARY_MIMETYPE:
+        if not dimension:
+            return None
+        return np.frombuffer(body, dtype=WIRE_DTYPE).reshape(-1, int(dimension))
+    if mimetype == MSGPACK_MIMETYPE and msgpack is not None:
+        payload = msgpack.unpackb(body, raw=False)
+        return np.frombuffer(payload['embeddings'], dtype=WIRE_DTYPE).reshape(-1, payload['dimension'])
+    if mimetype == JSON_MIMETYPE:
+        payload = json.loads(body)
+        embeddings = payload.get('embeddings')
+        if embeddings is None:
+            return None
+        return np.asarray(embeddings, dtype=WIRE_DTYPE).reshape(-1, payload['dimension'])
+    return None
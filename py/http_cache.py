@@ -0,0 +1,207 @@
+#http_cache.py
+"""
+Cache HTTP conditionnel (ETag / 304) piloté par la version des données.
+
+Les réponses de /statistics et /ml/* ne dépendent que du contenu de la base
+et des paramètres de la requête. L'ETag combine donc:
+  - un jeton de version des données (voir DataVersion),
+  - le chemin et les paramètres triés de la requête,
+  - l'empreinte du code source du service et de ses modules (un déploiement
+    invalide le cache).
+Une requête dont l'en-tête If-None-Match correspond reçoit 304 sans que la
+requête MongoDB, le modèle ou le rendu du graphique ne soient exécutés.
+Une réponse dégradée (voir mark_uncacheable) est servie sans ETag.
+"""
+import functools
+import hashlib
+import inspect
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+from flask import g, has_request_context, request, make_response
+from pymongo import MongoClient
+
+from data_versions import VERSION_COLLECTION_NAME, bump_data_version
+
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "5"))  # secondes entre deux sondages
+# Délai de sélection du serveur pour le sondage (30 s par défaut dans pymongo)
+DATA_VERSION_TIMEOUT_MS = int(os.getenv("DATA_VERSION_TIMEOUT_MS", "2000"))
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "0"))
+# Par défaut le client garde la réponse mais la revalide à chaque utilisation
+CACHE_CONTROL = f"private, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate" if HTTP_CACHE_MAX_AGE else "no-cache"
+
+
+class DataVersion:
+    """
+    Jeton de version de la base, bon marché à obtenir et identique dans tous
+    les processus: nombre de documents, plus grand `_id` (insertions et
+    suppressions) et compteur de `data_versions` (incrémenté par chaque
+    écrivain, voir bump_data_version). Il est relu au plus toutes les `ttl`
+    secondes.
+
+    Quand un change stream est disponible (replica set / Atlas), chaque
+    processus surveille la collection: un changement incrémente le compteur
+    (une fois par événement, tous processus confondus), ce qui couvre aussi
+    les écritures faites hors de ce dépôt, et force la relecture du jeton
+    sans attendre le ttl.
+    """
+
+    def __init__(self, mongo_uri, db_name, collection_name, ttl=DATA_VERSION_TTL):
+        self.mongo_uri = mongo_uri
+        self.db_name = db_name
+        self.collection_name = collection_name
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._polled_token = None
+        self._polled_at = None  # None: jeton à relire
+        self._watcher_pid = None
+        self._client = None
+        self._client_pid = None
+
+    def _get_client(self):
+        # Un client par processus: MongoClient n'est pas réutilisable après un fork
+        with self._lock:
+            if self._client_pid != os.getpid():
+                self._client = MongoClient(self.mongo_uri, serverSelectionTimeoutMS=DATA_VERSION_TIMEOUT_MS)
+                self._client_pid = os.getpid()
+            return self._client
+
+    def _poll(self):
+        db = self._get_client()[self.db_name]
+        collection = db[self.collection_name]
+        count = collection.estimated_document_count()
+        last = collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+        version = db[VERSION_COLLECTION_NAME].find_one({'_id': self.collection_name})
+        return f"{count}-{last['_id'] if last else 0}-{version['version'] if version else 0}"
+
+    def _watch(self):
+        """
+        Thread de surveillance: tout changement de la collection incrémente sa
+        version, une seule fois pour tous les processus qui le voient (l'heure
+        de l'événement sert de clé, voir bump_data_version). Si l'incrément
+        échoue (ex. service en lecture seule), le cache local est tout de même
+        invalidé et la surveillance continue.
+        """
+        warned = False
+        bump_warned = False
+        while True:
+            client = MongoClient(self.mongo_uri)
+            try:
+                collection = client[self.db_name][self.collection_name]
+                with collection.watch() as stream:
+                    for change in stream:
+                        # Les changements déjà reçus (écriture en masse) comptent pour un seul
+                        buffered = stream.try_next()
+                        while buffered is not None:
+                            change = buffered
+                            buffered = stream.try_next()
+                        try:
+                            bump_data_version(collection, change.get('clusterTime'))
+                        except Exception as e:
+                            if not bump_warned:
+                                print(f"Impossible d'incrémenter la version des données: {e}")
+                                bump_warned = True
+                        with self._lock:
+                            self._polled_at = None
+            except Exception as e:
+                if not warned:
+                    print(f"Change stream indisponible, sondage toutes les {self.ttl}s: {e}")
+                    warned = True
+            finally:
+                client.close()
+            time.sleep(60)
+
+    def _ensure_watcher(self):
+        # Le thread est démarré dans chaque processus (les workers du lanceur sont forkés)
+        if self._watcher_pid != os.getpid():
+            self._watcher_pid = os.getpid()
+            threading.Thread(target=self._watch, daemon=True).start()
+
+    def token(self):
+        """
+        Jeton de version courant, ou None si la base est injoignable. Un échec
+        est lui aussi gardé `ttl` secondes: pendant une panne, les requêtes ne
+        paient pas chacune le délai de sélection du serveur.
+        """
+        with self._lock:
+            self._ensure_watcher()
+            if self._polled_at is not None and time.monotonic() - self._polled_at < self.ttl:
+                return self._polled_token
+
+        try:
+            token = self._poll()
+        except Exception as e:
+            print(f"Impossible d'obtenir la version des données: {e}")
+            token = None
+        with self._lock:
+            self._polled_token = token
+            self._polled_at = time.monotonic()
+        return token
+
+
+@functools.lru_cache(maxsize=None)
+def _directory_fingerprint(directory):
+    """Empreinte des modules Python du répertoire (service et modules qu'il utilise)"""
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.py'):
+            with open(os.path.join(directory, name), 'rb') as f:
+                digest.update(name.encode() + b'\0' + f.read())
+    return digest.hexdigest()[:12]
+
+
+def _source_fingerprint(view):
+    try:
+        return _directory_fingerprint(os.path.dirname(os.path.abspath(inspect.getsourcefile(view))))
+    except (OSError, TypeError):
+        return ''
+
+
+def mark_uncacheable():
+    """
+    Signale que la réponse en cours ne dépend pas que des données et des
+    paramètres (ex. résultats du fallback par nom quand le service d'embedding
+    est indisponible): elle est servie sans ETag, pour ne pas être revalidée
+    en 304 une fois le service rétabli.
+    """
+    if has_request_context():
+        g.http_cache_skip = True
+
+
+def _canonical_request():
+    args = sorted(request.args.items(multi=True))
+    return f"{request.path}?{urlencode(args)}"
+
+
+def conditional_get(data_version):
+    """
+    Décorateur de route GET: ajoute ETag et Cache-Control aux réponses 200 et
+    répond 304 Not Modified, sans exécuter la vue, si If-None-Match correspond.
+    """
+    def decorator(view):
+        fingerprint = _source_fingerprint(view)
+
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            token = data_version.token()
+            if token is None:
+                return view(*args, **kwargs)
+
+            etag = hashlib.sha1(f"{fingerprint}|{token}|{_canonical_request()}".encode()).hexdigest()[:32]
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if g.get('http_cache_skip'):
+                    response.headers['Cache-Control'] = 'no-store'
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = CACHE_CONTROL
+            return response
+
+        return wrapped
+    return decorator
@@ -0,0 +1,342 @@
+#launcher.py
+"""
+Lanceur de production multi-workers pour les services Flask.
+
+Le processus parent importe le service (modèle d'embeddings, numpy, sklearn,
+matplotlib...), ouvre le socket d'écoute puis forke les workers: le modèle
+et les imports lourds sont partagés en copie-sur-écriture au lieu d'être
+rechargés par chaque processus.
+
+Chaque worker fait son échauffement (`warm_up()` du service) avant
+d'accepter des connexions, et expose:
+  GET /health/live   vivacité du worker (200 tant que le processus répond)
+  GET /health/ready  disponibilité: 503 dès que le worker reçoit SIGTERM. Il
+                     continue de servir DRAIN_GRACE secondes avant de fermer,
+                     pour que le répartiteur de charge voie le 503 et retire
+                     l'instance avant que les connexions ne soient refusées.
+
+Signaux du parent:
+  SIGHUP          rechargement: le parent se ré-exécute (même pid) et réimporte
+                  le service, donc le nouveau code et le nouveau modèle, en
+                  gardant le socket d'écoute. Les anciens workers servent
+                  pendant ce temps; chacun n'est arrêté qu'une fois un nouveau
+                  worker prêt. Si le nouveau code ne se charge pas, le parent
+                  s'arrête et laisse les anciens workers servir (à relancer).
+  SIGTERM/SIGINT  arrêt propre: les workers passent en 503 sur /health/ready,
+                  servent encore DRAIN_GRACE secondes puis terminent leurs
+                  requêtes en cours
+
+Usage: python py/launcher.py embedding --workers 4
+"""
+import argparse
+import gc
+import importlib
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+
+SERVICES = {
+    'embedding': ('embedding_api_service', 5000),
+    'statistics': ('stat_analysis_service', 5001),
+    'ml': ('ml_classification_service', 5002),
+}
+
+# Bibliothèques de calcul dont le nombre de threads est fixé avant leur import
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+SHUTDOWN_TIMEOUT = 30  # secondes laissées aux workers pour terminer leurs requêtes
+READY_TIMEOUT = 120    # secondes laissées à un nouveau worker pour s'échauffer
+# Secondes pendant lesquelles un worker qui s'arrête sert encore (avec /health/ready en 503)
+DRAIN_GRACE = float(os.getenv("LAUNCHER_DRAIN_GRACE", "5"))
+
+# Transmis au parent ré-exécuté lors d'un rechargement
+LISTEN_FD_ENV = 'LAUNCHER_LISTEN_FD'
+OLD_WORKERS_ENV = 'LAUNCHER_OLD_WORKERS'
+PARENT_SIGNALS = {signal.SIGHUP, signal.SIGTERM, signal.SIGINT}
+
+
+def load_service(module_name):
+    """Importe le module du service (chargement du modèle) et ajoute les routes de santé"""
+    from flask import jsonify
+
+    service = importlib.import_module(module_name)
+    app = service.app
+    state = {'draining': False, 'started_at': time.time()}
+
+    def live():
+        return jsonify({'status': 'alive', 'pid': os.getpid(),
+                        'uptime': round(time.time() - state['started_at'], 1)}), 200
+
+    def ready():
+        # Pas d'état 'starting': le worker n'accepte aucune connexion avant la fin de son échauffement
+        if not state['draining']:
+            return jsonify({'status': 'ready', 'pid': os.getpid()}), 200
+        return jsonify({'status': 'draining', 'pid': os.getpid()}), 503
+
+    app.add_url_rule('/health/live', 'health_live', live)
+    app.add_url_rule('/health/ready', 'health_ready', ready)
+    return service, state
+
+
+def track_in_flight(app, state):
+    """Middleware WSGI qui compte les requêtes en cours (réponses en streaming comprises)"""
+    from werkzeug.wsgi import ClosingIterator
+
+    lock = threading.Lock()
+    state['in_flight'] = 0
+
+    def done():
+        with lock:
+            state['in_flight'] -= 1
+
+    def wrapped(environ, start_response):
+        with lock:
+            state['in_flight'] += 1
+        try:
+            return ClosingIterator(app(environ, start_response), [done])
+        except BaseException:
+            done()
+            raise
+
+    return wrapped
+
+
+def run_worker(service, state, listener, ready_fd):
+    """Boucle d'un worker: échauffement, signal de disponibilité au parent, service"""
+    from werkzeug.serving import make_server
+
+    host, port = listener.getsockname()[:2]
+    app = track_in_flight(service.app, state)
+    server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+
+    def shutdown_after_grace():
+        time.sleep(DRAIN_GRACE)
+        server.shutdown()
+
+    def drain(signum, frame):
+        if state['draining']:
+            return
+        state['draining'] = True
+        # shutdown() attend la fin de serve_forever: il doit tourner dans un autre thread
+        threading.Thread(target=shutdown_after_grace, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    warm_up = getattr(service, 'warm_up', None)
+    if warm_up is not None:
+        start = time.perf_counter()
+        warm_up()
+        print(f"[worker {os.getpid()}] échauffement terminé en {time.perf_counter() - start:.2f}s", flush=True)
+
+    os.write(ready_fd, b'1')
+    os.close(ready_fd)
+
+    server.serve_forever()
+
+    # Plus aucune connexion n'est acceptée: terminer les requêtes en cours avant de sortir
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    while state['in_flight'] > 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    print(f"[worker {os.getpid()}] arrêté", flush=True)
+
+
+class Arbiter:
+    """Processus parent: crée, surveille, remplace et arrête les workers"""
+
+    def __init__(self, service, state, listener, n_workers, old_workers=()):
+        self.service = service
+        self.state = state
+        self.listener = listener
+        self.n_workers = n_workers
+        self.workers = {}  # pid -> descripteur de lecture du signal de disponibilité
+        # Workers de l'image précédente du parent (rechargement), à remplacer
+        self.old_workers = set(old_workers)
+        self.reload_requested = False
+        self.stop_requested = False
+
+    def spawn_worker(self):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            exit_code = 0
+            try:
+                run_worker(self.service, self.state, self.listener, write_fd)
+            except Exception as e:
+                print(f"[worker {os.getpid()}] erreur fatale: {e}", flush=True)
+                exit_code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(exit_code)
+
+        os.close(write_fd)
+        self.workers[pid] = read_fd
+        return pid
+
+    def wait_ready(self, pid, timeout=READY_TIMEOUT):
+        """Attend que le worker signale la fin de son échauffement"""
+        read_fd = self.workers.get(pid)
+        if read_fd is None:
+            return False
+        readable, _, _ = select.select([read_fd], [], [], timeout)
+        return bool(readable) and os.read(read_fd, 1) == b'1'
+
+    def stop_worker(self, pid):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def forget_worker(self, pid):
+        read_fd = self.workers.pop(pid, None)
+        if read_fd is not None:
+            os.close(read_fd)
+
+    def reap(self):
+        """Récupère les workers terminés; retourne les pid morts"""
+        dead = []
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in self.workers:
+                dead.append((pid, status))
+                self.forget_worker(pid)
+            self.old_workers.discard(pid)
+        return dead
+
+    def reload(self):
+        """
+        Ré-exécute le parent avec le même pid: les workers restent ses enfants,
+        le socket d'écoute est hérité et les signaux reçus pendant le
+        rechargement restent en attente (masque conservé par exec).
+        """
+        print(f"[parent] rechargement: ré-exécution avec {len(self.workers)} workers en service", flush=True)
+        signal.pthread_sigmask(signal.SIG_BLOCK, PARENT_SIGNALS)
+        for read_fd in self.workers.values():
+            os.close(read_fd)
+        os.environ[LISTEN_FD_ENV] = str(self.listener.fileno())
+        os.environ[OLD_WORKERS_ENV] = ','.join(str(pid) for pid in list(self.workers) + list(self.old_workers))
+        os.execv(sys.executable, [sys.executable, os.path.abspath(__file__)] + sys.argv[1:])
+
+    def replace_old_workers(self):
+        """Remplace les workers de l'ancienne image un par un, sans descendre sous n_workers prêts"""
+        print(f"[parent] remplacement de {len(self.old_workers)} workers de l'ancienne version", flush=True)
+        for old_pid in list(self.old_workers):
+            if self.stop_requested:
+                return
+            if len(self.workers) < self.n_workers:
+                new_pid = self.spawn_worker()
+                if not self.wait_ready(new_pid):
+                    print(f"[parent] le worker {new_pid} n'est pas prêt, remplacement interrompu", flush=True)
+                    self.stop_worker(new_pid)
+                    return
+            self.stop_worker(old_pid)
+            self.old_workers.discard(old_pid)
+
+    def shutdown(self):
+        print("[parent] arrêt des workers...", flush=True)
+        for pid in list(self.workers) + list(self.old_workers):
+            self.stop_worker(pid)
+        deadline = time.monotonic() + DRAIN_GRACE + SHUTDOWN_TIMEOUT
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            print(f"[parent] le worker {pid} ne s'arrête pas, SIGKILL", flush=True)
+            os.kill(pid, signal.SIGKILL)
+            self.forget_worker(pid)
+        self.listener.close()
+
+    def run(self):
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, 'reload_requested', True))
+        signal.signal(signal.SIGTERM, lambda signum, frame: setattr(self, 'stop_requested', True))
+        signal.signal(signal.SIGINT, lambda signum, frame: setattr(self, 'stop_requested', True))
+        # Signaux bloqués avant un rechargement: délivrés maintenant que les gestionnaires sont en place
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, PARENT_SIGNALS)
+
+        # Les objets chargés avant le fork ne seront plus parcourus par le GC:
+        # les workers ne touchent pas leurs pages et la mémoire reste partagée
+        gc.collect()
+        gc.freeze()
+
+        if self.old_workers:
+            self.replace_old_workers()
+        while not self.stop_requested and len(self.workers) < self.n_workers:
+            self.spawn_worker()
+
+        while not self.stop_requested:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+
+            for pid, status in self.reap():
+                if not self.stop_requested:
+                    print(f"[parent] worker {pid} terminé (statut {status})", flush=True)
+            # Remplacer les workers morts de façon inattendue
+            while not self.stop_requested and len(self.workers) < self.n_workers:
+                self.spawn_worker()
+                time.sleep(0.1)  # évite une boucle de fork si le worker meurt au démarrage
+            time.sleep(0.5)
+
+        self.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lanceur multi-workers des services Flask")
+    parser.add_argument('service', choices=sorted(SERVICES), help="Service à lancer")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=None, help="Port (défaut: port habituel du service)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Nombre de workers (défaut: nombre de coeurs)")
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help="Threads des bibliothèques de calcul par worker "
+                             "(défaut: coeurs / workers, pour ne pas sursouscrire le CPU)")
+    parser.add_argument('--backlog', type=int, default=2048)
+    args = parser.parse_args()
+
+    module_name, default_port = SERVICES[args.service]
+    port = args.port or default_port
+
+    # À fixer avant l'import de numpy/torch/xgboost, qui lisent ces variables au chargement
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+    for var in THREAD_ENV_VARS:
+        os.environ.setdefault(var, str(threads))
+
+    # Après un rechargement: socket hérité et workers de l'ancienne version
+    inherited_fd = os.environ.pop(LISTEN_FD_ENV, None)
+    old_workers = [int(pid) for pid in os.environ.pop(OLD_WORKERS_ENV, '').split(',') if pid]
+
+    print(f"[parent] préchargement de {module_name}...", flush=True)
+    start = time.perf_counter()
+    try:
+        service, state = load_service(module_name)
+    except Exception as e:
+        if old_workers:
+            print(f"[parent] échec du chargement, les anciens workers {old_workers} continuent "
+                  f"de servir sans parent: {e}", flush=True)
+        raise
+    print(f"[parent] {module_name} chargé en {time.perf_counter() - start:.2f}s", flush=True)
+
+    if inherited_fd is not None:
+        listener = socket.socket(fileno=int(inherited_fd))
+    else:
+        listener = socket.create_server((args.host, port), backlog=args.backlog)
+    listener.set_inheritable(True)
+    print(f"[parent] {args.workers} workers sur http://{args.host}:{port} "
+          f"({threads} thread(s) de calcul par worker)", flush=True)
+
+    Arbiter(service, state, listener, args.workers, old_workers).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+#load_test.py
+"""
+Banc de charge local des trois services Flask.
+
+Chaque service est lancé dans son propre processus avec une base MongoDB en
+mémoire (jeux synthétiques) et le modèle d'embeddings factice, puis des
+scénarios de trafic concurrent sont joués contre eux. Le rapport JSON donne
+par scénario et niveau de concurrence: débit, latences p50/p95/p99 (globales
+et par endpoint), taux d'erreur et RSS des serveurs au cours du temps.
+
+Usage:
+    python py/load_test.py run --scenario mixed --concurrency 1,8,32 --duration 20
+    python py/load_test.py run --mix-file mon_scenario.json --output rapport.json
+    python py/load_test.py list
+
+Un fichier de scénario est une liste de requêtes pondérées:
+    [{"weight": 3, "service": "ml", "method": "GET", "path": "/ml/all?search={query}", "queries": "new"}]
+`queries` vaut "cached" (requêtes répétées parmi un petit ensemble) ou "new"
+(requête inédite à chaque appel). `batch` (POST /ml/batch) donne le nombre de
+recherches envoyées par requête.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import types
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import numpy as np
+
+SERVICES = {
+    'embedding': ('embedding_api_service', 5100),
+    'statistics': ('stat_analysis_service', 5101),
+    'ml': ('ml_classification_service', 5102),
+}
+
+CACHED_QUERIES = ['Half Life', 'Portal', 'Space Tactics', 'Zombie Farm', 'Dark Souls']
+QUERY_WORDS = ['Racing', 'Dungeon', 'Pixel', 'Kingdom', 'Quest', 'City', 'Legends', 'Simulator', 'Strike', 'Dota']
+
+SCENARIOS = {
+    'statistics': [
+        {'weight': 1, 'service': 'statistics', 'method': 'GET', 'path': '/statistics'},
+    ],
+    'embed': [
+        {'weight': 1, 'service': 'embedding', 'method': 'POST', 'path': '/embed', 'queries': 'new'},
+    ],
+    'ml-all-cached': [
+        {'weight': 1, 'service': 'ml', 'method': 'GET', 'path': '/ml/all?search={query}', 'queries': 'cached'},
+    ],
+    'ml-all-new': [
+        {'weight': 1, 'service': 'ml', 'method': 'GET', 'path': '/ml/all?search={query}', 'queries': 'new'},
+    ],
+    'ml-single': [
+        {'weight': 1, 'service': 'ml', 'method': 'GET', 'path': '/ml/random-forest?search={query}', 'queries': 'cached'},
+        {'weight': 1, 'service': 'ml', 'method': 'GET', 'path': '/ml/xgboost?search={query}', 'queries': 'cached'},
+        {'weight': 1, 'service': 'ml', 'method': 'GET', 'path': '/ml/kmeans?search={query}', 'queries': 'cached'},
+    ],
+    'ml-batch': [
+        {'weight': 1, 'service': 'ml', 'method': 'POST', 'path': '/ml/batch', 'queries': 'cached', 'batch': 5},
+    ],
+    'mixed': [
+        {'weight': 4, 'service': 'statistics', 'method': 'GET', 'path': '/statistics'},
+        {'weight': 4, 'service': 'embedding', 'method': 'POST', 'path': '/embed', 'queries': 'new'},
+        {'weight': 2, 'service': 'ml', 'method': 'GET', 'path': '/ml/all?search={query}', 'queries': 'cached'},
+        {'weight': 1, 'service': 'ml', 'method': 'GET', 'path': '/ml/all?search={query}', 'queries': 'new'},
+        {'weight': 1, 'service': 'ml', 'method': 'GET', 'path': '/ml/random-forest?search={query}', 'queries': 'new'},
+    ],
+}
+
+
+# Côté serveur: un service avec ses dépendances remplacées
+
+def serve(service_name, port, n_games):
+    """Lance un service avec la base en mémoire et le modèle factice (processus enfant)"""
+    import pymongo
+    from werkzeug.serving import make_server
+    from local_standins import InMemoryMongoClient, StubEmbeddingModel, QuietRequestHandler, seed_games
+
+    sys.modules['sentence_transformers'] = types.SimpleNamespace(SentenceTransformer=StubEmbeddingModel)
+    pymongo.MongoClient = InMemoryMongoClient
+    InMemoryMongoClient()['steam_data']['games'].documents.extend(seed_games(n_games))
+
+    module_name, _ = SERVICES[service_name]
+    service = __import__(module_name)
+    server = make_server('127.0.0.1', port, service.app, threaded=True, request_handler=QuietRequestHandler)
+    print(f"[{service_name}] prêt sur le port {port} ({n_games} jeux)", flush=True)
+    server.serve_forever()
+
+
+def wait_for_port(port, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def read_rss_mb(pid):
+    """RSS d'un processus en Mo (Linux, /proc)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def start_services(names, n_games):
+    env = dict(os.environ, EMBEDDING_SERVICE_URL=f"http://127.0.0.1:{SERVICES['embedding'][1]}/embed")
+    processes = {}
+    for name in names:
+        processes[name] = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), 'serve', name, '--games', str(n_games)],
+            env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+    for name in names:
+        if not wait_for_port(SERVICES[name][1]):
+            stop_services(processes)
+            raise RuntimeError(f"Le service {name} n'a pas démarré")
+    return processes
+
+
+def stop_services(processes):
+    for process in processes.values():
+        process.terminate()
+    for process in processes.values():
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# Côté client: génération de charge
+
+class RssSampler(threading.Thread):
+    """Échantillonne le RSS des serveurs pendant un scénario"""
+
+    def __init__(self, processes, interval=0.5):
+        super().__init__(daemon=True)
+        self.processes = processes
+        self.interval = interval
+        self.samples = {name: [] for name in processes}
+        self._stop_event = threading.Event()
+        self._start = time.monotonic()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            t = round(time.monotonic() - self._start, 2)
+            for name, process in self.processes.items():
+                rss = read_rss_mb(process.pid)
+                if rss is not None:
+                    self.samples[name].append([t, round(rss, 1)])
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def draw_query(entry, rng, counter):
+    if entry.get('queries') == 'cached':
+        return rng.choice(CACHED_QUERIES)
+    if entry.get('queries') == 'new':
+        return f"{rng.choice(QUERY_WORDS)} {rng.choice(QUERY_WORDS)} {next(counter)}"
+    return None
+
+
+def build_request(entry, rng, counter):
+    query = draw_query(entry, rng, counter)
+
+    url = f"http://127.0.0.1:{SERVICES[entry['service']][1]}{entry['path']}"
+    if query is not None:
+        url = url.replace('{query}', quote(query))
+    body = {'text': query} if entry['method'] == 'POST' else None
+    if entry.get('batch'):
+        # Une requête batch porte plusieurs recherches tirées de la même façon
+        body = {'queries': [query] + [draw_query(entry, rng, counter) for _ in range(entry['batch'] - 1)]}
+    endpoint = f"{entry['method']} {entry['path'].split('?')[0]} ({entry.get('queries', '-')})"
+    return endpoint, entry['method'], url, body
+
+
+def load_worker(mix, deadline, seed, results, counter, timeout):
+    import requests
+
+    rng = random.Random(seed)
+    weights = [entry['weight'] for entry in mix]
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        entry = rng.choices(mix, weights)[0]
+        endpoint, method, url, body = build_request(entry, rng, counter)
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, json=body, timeout=timeout)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        results.append((endpoint, (time.perf_counter() - start) * 1000, ok))
+    session.close()
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return None
+    values = np.asarray(latencies)
+    return {
+        'mean': round(float(values.mean()), 2),
+        'p50': round(float(np.percentile(values, 50)), 2),
+        'p95': round(float(np.percentile(values, 95)), 2),
+        'p99': round(float(np.percentile(values, 99)), 2),
+        'max': round(float(values.max()), 2)
+    }
+
+
+def run_scenario(name, mix, concurrency, duration, processes, timeout):
+    counter = iter(range(10 ** 9))
+    results = []  # list.append est atomique: partagée entre les threads clients
+    sampler = RssSampler(processes)
+    sampler.start()
+
+    deadline = time.monotonic() + duration
+    start = time.monotonic()
+    threads = [
+        threading.Thread(target=load_worker, args=(mix, deadline, i, results, counter, timeout))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    sampler.stop()
+
+    by_endpoint = {}
+    for endpoint in sorted({r[0] for r in results}):
+        endpoint_results = [r for r in results if r[0] == endpoint]
+        by_endpoint[endpoint] = {
+            'requests': len(endpoint_results),
+            'error_rate': round(sum(not r[2] for r in endpoint_results) / len(endpoint_results), 4),
+            'latency_ms': latency_summary([r[1] for r in endpoint_results])
+        }
+
+    errors = sum(not r[2] for r in results)
+    report = {
+        'scenario': name,
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2),
+        'requests': len(results),
+        'throughput_rps': round(len(results) / elapsed, 2),
+        'error_rate': round(errors / len(results), 4) if results else None,
+        'latency_ms': latency_summary([r[1] for r in results]),
+        'by_endpoint': by_endpoint,
+        'rss_mb': sampler.samples,
+        'rss_peak_mb': {svc: max((s[1] for s in samples), default=None) for svc, samples in sampler.samples.items()}
+    }
+    latency = report['latency_ms'] or {}
+    print(f"{name:<14} c={concurrency:<3} {report['throughput_rps']:8.1f} req/s  "
+          f"p50={latency.get('p50')} ms  p95={latency.get('p95')} ms  p99={latency.get('p99')} ms  "
+          f"erreurs={report['error_rate']}", flush=True)
+    return report
+
+
+def run(args):
+    if args.mix_file:
+        with open(args.mix_file, encoding='utf-8') as f:
+            scenarios = {os.path.splitext(os.path.basename(args.mix_file))[0]: json.load(f)}
+    else:
+        names = args.scenario or ['mixed']
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise SystemExit(f"Scénarios inconnus: {', '.join(unknown)} (voir 'list')")
+        scenarios = {name: SCENARIOS[name] for name in names}
+    concurrency_levels = [int(c) for c in args.concurrency.split(',')]
+
+    # Le service ML a besoin du service d'embedding pour la recherche vectorielle
+    needed = {entry['service'] for mix in scenarios.values() for entry in mix}
+    if 'ml' in needed:
+        needed.add('embedding')
+    processes = start_services(sorted(needed), args.games)
+
+    report = {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'games': args.games,
+            'duration_s': args.duration,
+            'concurrency': concurrency_levels,
+            'timeout_s': args.timeout,
+            'scenarios': scenarios,
+            'cpu_count': os.cpu_count()
+        },
+        'runs': []
+    }
+    try:
+        for name, mix in scenarios.items():
+            for concurrency in concurrency_levels:
+                report['runs'].append(run_scenario(name, mix, concurrency, args.duration, processes, args.timeout))
+    finally:
+        stop_services(processes)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRapport écrit dans {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tests de charge locaux des services Flask")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Lancer les services et jouer les scénarios")
+    run_parser.add_argument('--scenario', action='append', help="Scénario prédéfini (répétable, défaut: mixed)")
+    run_parser.add_argument('--mix-file', help="Fichier JSON décrivant un scénario personnalisé")
+    run_parser.add_argument('--concurrency', default='1,8', help="Niveaux de concurrence, ex. 1,8,32")
+    run_parser.add_argument('--duration', type=float, default=15, help="Durée de chaque run (s)")
+    run_parser.add_argument('--games', type=int, default=5000, help="Nombre de jeux synthétiques")
+    run_parser.add_argument('--timeout', type=float, default=60, help="Timeout par requête (s)")
+    run_parser.add_argument('--output', default='load_test_report.json')
+
+    serve_parser = subparsers.add_parser('serve', help="(interne) servir un service avec les remplaçants locaux")
+    serve_parser.add_argument('service', choices=sorted(SERVICES))
+    serve_parser.add_argument('--games', type=int, default=5000)
+
+    subparsers.add_parser('list', help="Lister les scénarios prédéfinis")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args)
+    elif args.command == 'serve':
+        serve(args.service, SERVICES[args.service][1], args.games)
+    elif args.command == 'list':
+        for name, mix in SCENARIOS.items():
+            print(f"{name}: " + ', '.join(f"{e['method']} {e['path']} x{e['weight']}" for e in mix))
+
+
+if __name__ == '__main__':
+    main()
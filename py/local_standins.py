@@ -0,0 +1,318 @@
+#local_standins.py
+"""
+Remplaçants locaux des dépendances lourdes, pour les benchmarks et les tests
+de charge sans télécharger le modèle ni se connecter à MongoDB Atlas.
+"""
+import hashlib
+import operator
+import re
+import types
+from datetime import datetime, timezone
+
+import numpy as np
+from werkzeug.serving import WSGIRequestHandler
+
+STUB_EMBEDDING_DIMENSION = 384
+
+
+class StubEmbeddingModel:
+    """
+    Imite l'interface de SentenceTransformer utilisée par les services:
+    chaque texte donne un vecteur unitaire déterministe (graine dérivée du texte).
+    """
+
+    def __init__(self, model_name=None, dimension=STUB_EMBEDDING_DIMENSION):
+        self.model_name = model_name
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def _embed_one(self, text):
+        seed = int.from_bytes(hashlib.sha1(str(text).encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def encode(self, sentences, show_progress_bar=False, **kwargs):
+        if isinstance(sentences, str):
+            return self._embed_one(sentences)
+        if not len(sentences):
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.stack([self._embed_one(text) for text in sentences])
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Gestionnaire werkzeug sans journal d'accès (le log par requête fausse les mesures)"""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+# MongoDB en mémoire: sous-ensemble de l'API pymongo utilisé par les services
+
+class _Missing:
+    pass
+
+
+_MISSING = _Missing()
+
+_COMPARISONS = {
+    '$gt': operator.gt,
+    '$gte': operator.ge,
+    '$lt': operator.lt,
+    '$lte': operator.le
+}
+
+
+def _get_path(doc, path):
+    value = doc
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _match_condition(value, condition):
+    if not isinstance(condition, dict) or not any(k.startswith('$') for k in condition):
+        return value == condition
+    for op, arg in condition.items():
+        if op == '$exists':
+            if (value is not _MISSING) != bool(arg):
+                return False
+        elif op == '$eq':
+            if value != arg:
+                return False
+        elif op == '$ne':
+            if value == arg:
+                return False
+        elif op == '$in':
+            if value not in arg:
+                return False
+        elif op == '$type':
+            if arg == 'number' and not (isinstance(value, (int, float)) and not isinstance(value, bool)):
+                return False
+        elif op in _COMPARISONS:
+            if not isinstance(value, (int, float)) or not _COMPARISONS[op](value, arg):
+                return False
+        elif op == '$regex':
+            flags = re.IGNORECASE if 'i' in condition.get('$options', '') else 0
+            if not isinstance(value, str) or not re.search(arg, value, flags):
+                return False
+        elif op == '$options':
+            continue
+        else:
+            raise NotImplementedError(f"Opérateur non supporté par la base en mémoire: {op}")
+    return True
+
+
+def _matches(doc, query):
+    return all(_match_condition(_get_path(doc, field), condition) for field, condition in query.items())
+
+
+def _project(doc, projection, score=None):
+    if not projection:
+        return dict(doc)
+    included = {k: v for k, v in projection.items() if v not in (0, False)}
+    if not included:
+        return {k: v for k, v in doc.items() if k not in projection}
+    result = {}
+    if projection.get('_id', 1) not in (0, False) and '_id' in doc:
+        result['_id'] = doc['_id']
+    for field, spec in included.items():
+        if isinstance(spec, dict) and spec.get('$meta') == 'vectorSearchScore':
+            result[field] = score
+        elif isinstance(spec, str) and spec.startswith('$'):
+            value = _get_path(doc, spec[1:])
+            if value is not _MISSING:
+                result[field] = value
+        else:
+            value = _get_path(doc, field)
+            if value is not _MISSING:
+                result[field] = value
+    return result
+
+
+class InMemoryCursor(list):
+    def limit(self, n):
+        return InMemoryCursor(self[:n]) if n else self
+
+    def batch_size(self, n):
+        return self
+
+
+class InMemoryCollection:
+    """Collection en mémoire: find, aggregate ($vectorSearch, $match, $project, $limit), update_one, update_many, bulk_write"""
+
+    def __init__(self, name, database, documents=None):
+        self.name = name
+        self.database = database
+        self.documents = documents if documents is not None else []
+        self._vector_index = {}
+
+    def _vectors(self, path):
+        """Matrice normalisée des vecteurs du champ `path` (recalculée après écriture)"""
+        if path not in self._vector_index:
+            docs = [doc for doc in self.documents if isinstance(doc.get(path), list)]
+            matrix = np.array([doc[path] for doc in docs], dtype=np.float32).reshape(len(docs), -1)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._vector_index[path] = (docs, matrix / np.where(norms == 0, 1, norms))
+        return self._vector_index[path]
+
+    def find(self, query=None, projection=None):
+        query = query or {}
+        return InMemoryCursor(_project(doc, projection) for doc in self.documents if _matches(doc, query))
+
+    def aggregate(self, pipeline):
+        rows = [(doc, None) for doc in self.documents]
+        for stage in pipeline:
+            name, spec = next(iter(stage.items()))
+            if name == '$vectorSearch':
+                docs, matrix = self._vectors(spec['path'])
+                query = np.asarray(spec['queryVector'], dtype=np.float32)
+                # Score Atlas pour la similarité cosinus: (1 + cos) / 2
+                scores = (1 + matrix @ (query / np.linalg.norm(query))) / 2
+                top = np.argsort(-scores)[:spec.get('limit', 10)]
+                rows = [(docs[i], float(scores[i])) for i in top]
+            elif name == '$match':
+                rows = [(doc, score) for doc, score in rows if _matches(doc, spec)]
+            elif name == '$project':
+                rows = [(_project(doc, spec, score), score) for doc, score in rows]
+            elif name == '$limit':
+                rows = rows[:spec]
+            else:
+                raise NotImplementedError(f"Étape non supportée par la base en mémoire: {name}")
+        return InMemoryCursor(doc for doc, _ in rows)
+
+    def find_one(self, query=None, projection=None, sort=None):
+        documents = self.find(query, projection)
+        for field, direction in reversed(sort or []):
+            documents.sort(key=lambda doc: doc.get(field), reverse=direction < 0)
+        return documents[0] if documents else None
+
+    def replace_one(self, query, replacement, upsert=False):
+        for i, doc in enumerate(self.documents):
+            if _matches(doc, query):
+                self.documents[i] = dict(replacement, _id=doc['_id'])
+                break
+        else:
+            if upsert:
+                self.documents.append(dict(replacement))
+        self._vector_index.clear()
+
+    def update_one(self, query, update, upsert=False):
+        """Opérateurs $set, $inc et $currentDate"""
+        doc = next((doc for doc in self.documents if _matches(doc, query)), None)
+        if doc is None:
+            if not upsert:
+                return
+            doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+            self.documents.append(doc)
+        doc.update(update.get('$set', {}))
+        for path, amount in update.get('$inc', {}).items():
+            # Chemin pointé, avec indices de tableau (ex. 'cluster_sizes.3')
+            *parents, last = path.split('.')
+            target = doc
+            for part in parents:
+                target = target[int(part)] if isinstance(target, list) else target.setdefault(part, {})
+            if isinstance(target, list):
+                target[int(last)] += amount
+            else:
+                target[last] = target.get(last, 0) + amount
+        for field in update.get('$currentDate', {}):
+            doc[field] = datetime.now(timezone.utc)
+        self._vector_index.clear()
+
+    def update_many(self, query, update):
+        """Opérateur $set; retourne un résultat avec modified_count"""
+        matched = [doc for doc in self.documents if _matches(doc, query)]
+        for doc in matched:
+            doc.update(update.get('$set', {}))
+        self._vector_index.clear()
+        return types.SimpleNamespace(matched_count=len(matched), modified_count=len(matched))
+
+    def count_documents(self, query):
+        return sum(1 for doc in self.documents if _matches(doc, query))
+
+    def estimated_document_count(self):
+        return len(self.documents)
+
+    def bulk_write(self, requests):
+        by_id = {doc['_id']: doc for doc in self.documents}
+        for op in requests:
+            doc = by_id.get(op._filter.get('_id'))
+            if doc is not None:
+                doc.update(op._doc.get('$set', {}))
+        self._vector_index.clear()
+
+
+class InMemoryDatabase:
+    def __init__(self, name):
+        self.name = name
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = InMemoryCollection(name, self)
+        return self.collections[name]
+
+    def command(self, command):
+        raise NotImplementedError("La base en mémoire ne supporte pas les commandes (explain...)")
+
+
+class InMemoryMongoClient:
+    """
+    Remplace `pymongo.MongoClient`: toutes les instances partagent les mêmes
+    bases, pour que les connexions ouvertes à chaque requête voient les données.
+    """
+    databases = {}
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getitem__(self, name):
+        if name not in self.databases:
+            self.databases[name] = InMemoryDatabase(name)
+        return self.databases[name]
+
+    def close(self):
+        pass
+
+
+GAME_WORDS = ['Half', 'Life', 'Portal', 'Counter', 'Strike', 'Dota', 'Space', 'Dungeon', 'Racing', 'Farm',
+              'Simulator', 'Legends', 'Tactics', 'Zombie', 'Quest', 'Kingdom', 'Pixel', 'Dark', 'Souls', 'City']
+
+
+def seed_games(n_games=5000, model=None, seed=42):
+    """
+    Génère des jeux synthétiques au format de la collection `games` (avis à
+    queue lourde, développeurs répartis selon une loi de Zipf, embeddings du
+    modèle factice sur 'name developer').
+    """
+    from bson import ObjectId
+
+    model = model or StubEmbeddingModel()
+    rng = np.random.default_rng(seed)
+    developers = [f'Studio {i}' for i in range(200)]
+    developer_idx = np.minimum(rng.zipf(1.6, n_games) - 1, len(developers) - 1)
+    positive = np.floor(rng.lognormal(5, 2.2, n_games)).astype(int)
+    negative = np.floor(positive * rng.beta(2, 8, n_games)).astype(int)
+
+    names = [' '.join(rng.choice(GAME_WORDS, 2)) + f' {i}' for i in range(n_games)]
+    embeddings = model.encode([f'{name} {developers[d]}' for name, d in zip(names, developer_idx)])
+
+    games = []
+    for i in range(n_games):
+        games.append({
+            '_id': ObjectId(),
+            'name': names[i],
+            'developer': developers[developer_idx[i]],
+            'positive': int(positive[i]),
+            'negative': int(negative[i]),
+            'owners': '20,000 .. 50,000',
+            'average_playtime': int(rng.integers(0, 2000)),
+            'median_playtime': int(rng.integers(0, 1000)),
+            'price': int(rng.choice([0, 499, 999, 1999, 5999])),
+            'combined_embedding': embeddings[i].tolist()
+        })
+    return games
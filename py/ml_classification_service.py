@@ -1,11 +1,12 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context
 from flask_cors import CORS
 from pymongo import MongoClient
 import numpy as np
 import pandas as pd
 import matplotlib
 matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+# Une Figure par graphique (API objet): l'état global de pyplot n'est pas thread-safe
+from matplotlib.figure import Figure
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
@@ -15,35 +16,96 @@ import xgboost as xgb
 from io import BytesIO
 import base64
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 import seaborn as sns
-import requests
+from embedding_client import EmbeddingClient
+from query_profiler import profiled_find, profiled_aggregate
+from training_budget import TrainingBudget, fit_forest_within_budget, fit_boosting_within_budget, fit_kmeans_within_budget
+from http_cache import DataVersion, conditional_get, mark_uncacheable
+from theme_clustering import load_theme_model, EMBEDDING_FIELD, THEME_FIELD
 
 # Configuration
 load_dotenv()
 MONGO_URI = os.getenv("MONGODB_URI")
 DB_NAME = 'steam_data'
 COLLECTION_NAME = 'games'
+KMEANS_MODES = ('reviews', 'embedding')
+BATCH_MAX_QUERIES = 20
+BATCH_SEARCH_WORKERS = 8
+BATCH_MODEL_WORKERS = int(os.getenv("BATCH_MODEL_WORKERS", "4"))  # recherches du lot modélisées en parallèle
 
 app = Flask(__name__)
 CORS(app)
 
+# Version des données: les réponses /ml/* sont servies en 304 tant qu'elle ne change pas
+data_version = DataVersion(MONGO_URI, DB_NAME, COLLECTION_NAME)
+
+# Client partagé: connexions keep-alive, retries et disjoncteur vers le service d'embedding
+embedding_client = EmbeddingClient()
+
 
 def get_embedding(text):
     """Obtient l'embedding d'un texte via le service d'embedding"""
-    try:
-        response = requests.post(
-            'http://localhost:5000/embed',
-            json={'text': text},
-            timeout=10
-        )
-        if response.ok:
-            data = response.json()
-            return data.get('embedding')
-        return None
-    except Exception as e:
-        print(f"Erreur lors de l'obtention de l'embedding: {e}")
+    embedding = embedding_client.embed(text)
+    if embedding is None:
         return None
+    # $vectorSearch attend une liste de nombres (BSON), pas un tableau numpy
+    return embedding.tolist()
+
+
+def search_games(collection, search_query, query_embedding):
+    """Recherche vectorielle si l'embedding est disponible, sinon recherche par nom"""
+    if query_embedding:
+        # Recherche vectorielle
+        games = profiled_aggregate(collection, [
+            {
+                '$vectorSearch': {
+                    'queryVector': query_embedding,
+                    'path': 'combined_embedding',
+                    'index': 'vector_index',
+                    'limit': 500,  # Limiter à 500 jeux les plus pertinents
+                    'numCandidates': 1000
+                }
+            },
+            {
+                '$project': {
+                    '_id': 1,
+                    'name': 1,
+                    'developer': 1,
+                    'positive': 1,
+                    'negative': 1,
+                    'owners': 1,
+                    'average_playtime': 1,
+                    'median_playtime': 1,
+                    'price': 1,
+                    'score': {'$meta': 'vectorSearchScore'}
+                }
+            }
+        ], label='ml.get_games_data.vector_search')
+        print(f"Recherche vectorielle: {len(games)} jeux trouvés")
+        return games
+
+    # Fallback sur recherche par nom
+    print("Fallback sur recherche par nom")
+    return profiled_find(
+        collection,
+        {'name': {'$regex': search_query, '$options': 'i'}},
+        {
+            '_id': 1,
+            'name': 1,
+            'developer': 1,
+            'positive': 1,
+            'negative': 1,
+            'owners': 1,
+            'average_playtime': 1,
+            'median_playtime': 1,
+            'price': 1
+        },
+        limit=500,
+        label='ml.get_games_data.name_regex'
+    )
 
 
 def get_games_data(search_query=None):
@@ -57,55 +119,13 @@ def get_games_data(search_query=None):
         if search_query:
             print(f"Recherche vectorielle pour: {search_query}")
             query_embedding = get_embedding(search_query)
-            
-            if query_embedding:
-                # Recherche vectorielle
-                games = list(collection.aggregate([
-                    {
-                        '$vectorSearch': {
-                            'queryVector': query_embedding,
-                            'path': 'combined_embedding',
-                            'index': 'vector_index',
-                            'limit': 500,  # Limiter à 500 jeux les plus pertinents
-                            'numCandidates': 1000
-                        }
-                    },
-                    {
-                        '$project': {
-                            '_id': 1,
-                            'name': 1,
-                            'developer': 1,
-                            'positive': 1,
-                            'negative': 1,
-                            'owners': 1,
-                            'average_playtime': 1,
-                            'median_playtime': 1,
-                            'price': 1,
-                            'score': {'$meta': 'vectorSearchScore'}
-                        }
-                    }
-                ]))
-                print(f"Recherche vectorielle: {len(games)} jeux trouvés")
-            else:
-                # Fallback sur recherche par nom
-                print("Fallback sur recherche par nom")
-                games = list(collection.find(
-                    {'name': {'$regex': search_query, '$options': 'i'}},
-                    {
-                        '_id': 1,
-                        'name': 1,
-                        'developer': 1,
-                        'positive': 1,
-                        'negative': 1,
-                        'owners': 1,
-                        'average_playtime': 1,
-                        'median_playtime': 1,
-                        'price': 1
-                    }
-                ).limit(500))
+            if not query_embedding:
+                # Résultats du fallback par nom: ne pas les servir en 304 après le retour du service
+                mark_uncacheable()
+            games = search_games(collection, search_query, query_embedding)
         else:
             # Récupérer tous les jeux (limité à 1000 pour les performances)
-            games = list(collection.find({}, {
+            games = profiled_find(collection, {}, {
                 '_id': 1,
                 'name': 1,
                 'developer': 1,
@@ -115,7 +135,7 @@ def get_games_data(search_query=None):
                 'average_playtime': 1,
                 'median_playtime': 1,
                 'price': 1
-            }).limit(1000))
+            }, limit=1000, label='ml.get_games_data.all')
         
         client.close()
         return games
@@ -124,31 +144,107 @@ def get_games_data(search_query=None):
         return None
 
 
+def get_games_data_batch(search_queries):
+    """
+    Résultats de plusieurs recherches: un seul appel au service d'embedding
+    pour tout le lot, puis les recherches vectorielles en parallèle sur un
+    client MongoDB partagé. Retourne une liste alignée sur `search_queries`
+    (None pour une recherche en erreur).
+    """
+    embeddings = embedding_client.embed_many(search_queries)
+    if embeddings is None:
+        print("Embeddings du lot indisponibles, fallback sur recherche par nom")
+
+    client = MongoClient(MONGO_URI)
+    collection = client[DB_NAME][COLLECTION_NAME]
+
+    def search(index):
+        query_embedding = embeddings[index].tolist() if embeddings is not None else None
+        try:
+            return search_games(collection, search_queries[index], query_embedding)
+        except Exception as e:
+            print(f"Erreur lors de la recherche '{search_queries[index]}': {e}")
+            return None
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(BATCH_SEARCH_WORKERS, len(search_queries))) as executor:
+            return list(executor.map(search, range(len(search_queries))))
+    finally:
+        client.close()
+
+
+def prepare_games_frame(games):
+    """
+    DataFrame nettoyé commun aux trois algorithmes: avis numériques, total
+    et ratio positif. Les autres colonnes sont laissées telles quelles.
+    """
+    df = pd.DataFrame(games)
+    df['positive'] = pd.to_numeric(df['positive'], errors='coerce').fillna(0)
+    df['negative'] = pd.to_numeric(df['negative'], errors='coerce').fillna(0)
+    df['total_reviews'] = df['positive'] + df['negative']
+    df['review_ratio'] = (df['positive'] / df['total_reviews']).where(df['total_reviews'] > 0, 0)
+    return df
+
+
+def load_games_frame(search_query=None, frame=None):
+    """
+    Frame nettoyé des jeux de la recherche, ou copie du frame déjà préparé
+    (routes /ml/all et /ml/batch). Retourne None si la récupération échoue.
+    """
+    if frame is not None:
+        return frame.copy()
+    games = get_games_data(search_query)
+    if not games:
+        return None
+    return prepare_games_frame(games)
+
+
+def build_batch_frames(results):
+    """
+    Un seul frame nettoyé pour l'union des résultats du lot (dédoublonnés par
+    _id), puis une vue par recherche dans l'ordre de ses résultats avec son
+    propre score. Retourne les frames (None si la recherche a échoué) et le
+    nombre de jeux distincts.
+    """
+    unique = {}
+    for games in results:
+        for game in games or []:
+            unique.setdefault(game['_id'], game)
+    if not unique:
+        return [None] * len(results), 0
+
+    # Le score de recherche vectorielle dépend de la requête: il n'est pas partagé
+    base = prepare_games_frame([{k: v for k, v in game.items() if k != 'score'} for game in unique.values()])
+    base = base.set_index('_id', drop=False)
+
+    frames = []
+    for games in results:
+        if not games:
+            frames.append(None)
+            continue
+        frame = base.loc[[game['_id'] for game in games]].reset_index(drop=True)
+        if 'score' in games[0]:
+            frame['score'] = [game.get('score') for game in games]
+        frames.append(frame)
+    return frames, len(base)
+
+
 ## Algorithme 1: Random Forest pour classifier les jeux par développeur
-def classify_valve_games(search_query=None):
+def classify_valve_games(search_query=None, budget=None, frame=None):
     """
     Algorithme 1: Random Forest pour classifier les jeux par développeur
+    La forêt est agrandie par paliers dans la limite du budget d'entraînement.
     """
+    budget = budget or TrainingBudget()
     try:
-        games = get_games_data(search_query)
-        if not games:
+        # DataFrame nettoyé (avis et ratio)
+        df = load_games_frame(search_query, frame)
+        if df is None or df.empty:
             return None, "Erreur lors de la récupération des données"
         
-        if len(games) < 10:
+        if len(df) < 10:
             return None, "Pas assez de jeux dans les résultats (minimum 10 requis)"
         
-        # Préparer le DataFrame
-        df = pd.DataFrame(games)
-        
-        # Nettoyer les données
-        df['positive'] = pd.to_numeric(df['positive'], errors='coerce').fillna(0)
-        df['negative'] = pd.to_numeric(df['negative'], errors='coerce').fillna(0)
-        df['total_reviews'] = df['positive'] + df['negative']
-        df['review_ratio'] = df.apply(
-            lambda x: x['positive'] / x['total_reviews'] if x['total_reviews'] > 0 else 0, 
-            axis=1
-        )
-        
         # Nettoyer les développeurs
         df['developer'] = df['developer'].fillna('Unknown')
         df['developer'] = df['developer'].apply(lambda x: str(x).strip() if isinstance(x, str) else 'Unknown')
@@ -187,14 +283,13 @@ def classify_valve_games(search_query=None):
                 X, y, test_size=0.3, random_state=42
             )
         
-        # Entraîner le modèle Random Forest
-        rf_model = RandomForestClassifier(
-            n_estimators=100, 
-            max_depth=15, 
-            random_state=42,
-            class_weight='balanced'
+        # Entraîner le modèle Random Forest (au plus 100 arbres, dans la limite du budget)
+        rf_model, budget_report = fit_forest_within_budget(
+            X_train, y_train, budget,
+            max_estimators=100,
+            max_depth=15,
+            random_state=42
         )
-        rf_model.fit(X_train, y_train)
         
         # Prédictions
         y_pred = rf_model.predict(X_test)
@@ -218,7 +313,8 @@ def classify_valve_games(search_query=None):
         developer_stats = developer_stats.sort_values('Nombre de jeux', ascending=False)
         
         # Visualisations
-        fig, axes = plt.subplots(1, 2, figsize=(14, 5))
+        fig = Figure(figsize=(14, 5))
+        axes = fig.subplots(1, 2)
         
         # 1. Distribution des jeux par développeur
         dev_counts = developer_stats['Nombre de jeux'].head(10)
@@ -236,12 +332,11 @@ def classify_valve_games(search_query=None):
         axes[1].axis('off')
         axes[1].set_title('Performance du Modèle')
         
-        plt.tight_layout()
+        fig.tight_layout()
         
         # Sauvegarder le graphique
         buffer = BytesIO()
-        plt.savefig(buffer, format='png', bbox_inches='tight', dpi=100)
-        plt.close()
+        fig.savefig(buffer, format='png', bbox_inches='tight', dpi=100)
         buffer.seek(0)
         image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
         buffer.close()
@@ -263,6 +358,7 @@ def classify_valve_games(search_query=None):
             'top_developers': top_developers.to_dict(),
             'developer_stats': developer_stats.to_dict(),
             'games_by_developer': games_by_developer,
+            'training_budget': budget_report,
             'image_base64': image_base64
         }
         
@@ -276,22 +372,16 @@ def classify_valve_games(search_query=None):
 
 
 ## Algorithme 2: XGBoost pour prédire un score de pertinence
-def predict_relevance_score(search_query=None):
+def predict_relevance_score(search_query=None, budget=None, frame=None):
     """
     Algorithme 2: XGBoost pour prédire un score de pertinence basé sur les variables
+    Le boosting s'arrête sur validation (early stopping) ou à l'épuisement du budget.
     """
-    games = get_games_data(search_query)
-    if not games:
+    budget = budget or TrainingBudget()
+    df = load_games_frame(search_query, frame)
+    if df is None or df.empty:
         return None, "Erreur lors de la récupération des données"
     
-    # Préparer le DataFrame
-    df = pd.DataFrame(games)
-    
-    # Nettoyer les données
-    df['positive'] = pd.to_numeric(df['positive'], errors='coerce').fillna(0)
-    df['negative'] = pd.to_numeric(df['negative'], errors='coerce').fillna(0)
-    df['total_reviews'] = df['positive'] + df['negative']
-    
     # Créer un score de pertinence (0-100) basé sur les avis positifs
     # Score = (positive / total_reviews) * 100 avec un poids pour le nombre total d'avis
     df['relevance_score'] = df.apply(
@@ -317,14 +407,14 @@ def predict_relevance_score(search_query=None):
         X, y, test_size=0.3, random_state=42
     )
     
-    # Entraîner XGBoost
-    xgb_model = xgb.XGBRegressor(
-        n_estimators=100,
+    # Entraîner XGBoost (au plus 100 itérations, dans la limite du budget)
+    xgb_model, budget_report = fit_boosting_within_budget(
+        X_train, y_train, budget,
+        max_rounds=100,
         max_depth=6,
         learning_rate=0.1,
         random_state=42
     )
-    xgb_model.fit(X_train, y_train)
     
     # Prédictions
     y_pred = xgb_model.predict(X_test)
@@ -340,7 +430,8 @@ def predict_relevance_score(search_query=None):
     top_games = df.nlargest(20, 'predicted_score')[['name', 'developer', 'positive', 'negative', 'predicted_score']]
     
     # Visualisation
-    fig, axes = plt.subplots(1, 2, figsize=(14, 5))
+    fig = Figure(figsize=(14, 5))
+    axes = fig.subplots(1, 2)
     
     # 1. Réel vs Prédit
     axes[0].scatter(y_test, y_pred, alpha=0.5, color='steelblue', edgecolors='black', linewidth=0.5)
@@ -357,12 +448,11 @@ def predict_relevance_score(search_query=None):
     axes[1].set_title('Distribution des Scores de Pertinence')
     axes[1].grid(axis='y', alpha=0.3)
     
-    plt.tight_layout()
+    fig.tight_layout()
     
     # Sauvegarder
     buffer = BytesIO()
-    plt.savefig(buffer, format='png', bbox_inches='tight', dpi=100)
-    plt.close()
+    fig.savefig(buffer, format='png', bbox_inches='tight', dpi=100)
     buffer.seek(0)
     image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
     buffer.close()
@@ -373,6 +463,7 @@ def predict_relevance_score(search_query=None):
         'mse': float(mse),
         'mae': float(mae),
         'top_games': top_games.to_dict('records'),
+        'training_budget': budget_report,
         'image_base64': image_base64
     }
     
@@ -380,27 +471,23 @@ def predict_relevance_score(search_query=None):
 
 
 ## Algorithme 3: K-Means pour regrouper les jeux par thématique
-def cluster_games_kmeans(search_query=None):
+def cluster_games_kmeans(search_query=None, mode='reviews', frame=None, budget=None):
     """
     Algorithme 3: K-Means pour regrouper les jeux par thématique
     et trouver le cluster contenant la même thématique
+    Les initialisations de K-Means s'arrêtent à l'épuisement du budget.
+    Le mode 'embedding' utilise le modèle thématique entraîné sur les embeddings
+    (affectation seule, sans entraînement ni budget).
     """
-    games = get_games_data(search_query)
-    if not games:
+    if mode == 'embedding':
+        return cluster_games_by_theme(search_query, frame)
+
+    budget = budget or TrainingBudget()
+
+    df = load_games_frame(search_query, frame)
+    if df is None or df.empty:
         return None, "Erreur lors de la récupération des données"
     
-    # Préparer le DataFrame
-    df = pd.DataFrame(games)
-    
-    # Nettoyer les données
-    df['positive'] = pd.to_numeric(df['positive'], errors='coerce').fillna(0)
-    df['negative'] = pd.to_numeric(df['negative'], errors='coerce').fillna(0)
-    df['total_reviews'] = df['positive'] + df['negative']
-    df['review_ratio'] = df.apply(
-        lambda x: x['positive'] / x['total_reviews'] if x['total_reviews'] > 0 else 0,
-        axis=1
-    )
-    
     # Filtrer les jeux avec des données suffisantes
     df = df[df['total_reviews'] >= 10].copy()
     
@@ -415,18 +502,10 @@ def cluster_games_kmeans(search_query=None):
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
     
-    # Déterminer le nombre optimal de clusters avec la méthode du coude
-    inertias = []
-    K_range = range(2, min(11, len(df) // 10))
-    for k in K_range:
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-        kmeans.fit(X_scaled)
-        inertias.append(kmeans.inertia_)
-    
-    # Utiliser 5 clusters par défaut
+    # 5 clusters (au plus 10 initialisations, dans la limite du budget)
     n_clusters = 5
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    df['cluster'] = kmeans.fit_predict(X_scaled)
+    kmeans, budget_report = fit_kmeans_within_budget(X_scaled, n_clusters, budget, n_init=10)
+    df['cluster'] = kmeans.labels_
     
     # Trouver le jeu de référence (le premier dans les résultats)
     reference_game = df.iloc[0]
@@ -447,7 +526,8 @@ def cluster_games_kmeans(search_query=None):
     cluster_stats.columns = ['Positive Moyen', 'Negative Moyen', 'Total Reviews Moyen', 'Ratio Positif Moyen', 'Nombre de Jeux']
     
     # Visualisations
-    fig, axes = plt.subplots(1, 2, figsize=(14, 5))
+    fig = Figure(figsize=(14, 5))
+    axes = fig.subplots(1, 2)
     
     # 1. Scatter plot des clusters (Positive vs Negative)
     scatter = axes[0].scatter(
@@ -479,7 +559,7 @@ def cluster_games_kmeans(search_query=None):
     axes[0].set_xlim(0, df['positive'].quantile(0.95) * 1.1)
     axes[0].set_ylim(0, df['negative'].quantile(0.95) * 1.1)
     axes[0].grid(alpha=0.3)
-    plt.colorbar(scatter, ax=axes[0], label='Cluster')
+    fig.colorbar(scatter, ax=axes[0], label='Cluster')
     
     # 2. Distribution des jeux par cluster
     cluster_counts = df['cluster'].value_counts().sort_index()
@@ -492,12 +572,11 @@ def cluster_games_kmeans(search_query=None):
     axes[1].set_xticks(range(n_clusters))
     axes[1].grid(axis='y', alpha=0.3)
     
-    plt.tight_layout()
+    fig.tight_layout()
     
     # Sauvegarder
     buffer = BytesIO()
-    plt.savefig(buffer, format='png', bbox_inches='tight', dpi=100)
-    plt.close()
+    fig.savefig(buffer, format='png', bbox_inches='tight', dpi=100)
     buffer.seek(0)
     image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
     buffer.close()
@@ -510,74 +589,370 @@ def cluster_games_kmeans(search_query=None):
         'cluster_stats': cluster_stats.to_dict(),
         'cluster_games': cluster_games.to_dict('records'),
         'total_games_analyzed': len(df),
+        'training_budget': budget_report,
         'image_base64': image_base64
     }
     
     return result, None
 
 
+def cluster_games_by_theme(search_query=None, frame=None):
+    """
+    Algorithme 3 (mode embedding): affecte les jeux trouvés aux clusters du
+    modèle thématique (PCA incrémentale + MiniBatchKMeans sur les embeddings,
+    voir theme_clustering.py) et retourne les jeux du même thème que le jeu
+    de référence dans toute la collection.
+    """
+    df = load_games_frame(search_query, frame)
+    if df is None or df.empty:
+        return None, "Erreur lors de la récupération des données"
+
+    client = MongoClient(MONGO_URI)
+    try:
+        db = client[DB_NAME]
+        collection = db[COLLECTION_NAME]
+        model = load_theme_model(db)
+        if model is None:
+            return None, "Modèle thématique absent: lancer 'python py/theme_clustering.py fit'"
+
+        # Embeddings des jeux trouvés (les résultats de recherche ne les contiennent pas)
+        ids = df['_id'].tolist()
+        embeddings = {
+            doc['_id']: doc[EMBEDDING_FIELD] for doc in profiled_find(
+                collection,
+                {'_id': {'$in': ids}, EMBEDDING_FIELD: {'$exists': True}},
+                {EMBEDDING_FIELD: 1},
+                label='ml.theme.result_embeddings'
+            )
+        }
+
+        df = df[df['_id'].isin(list(embeddings))].copy()
+        if len(df) < 10:
+            return None, "Pas assez de jeux avec embedding pour le clustering thématique"
+
+        X = np.array([embeddings[_id] for _id in df['_id']], dtype=np.float32)
+        df['cluster'] = model.assign(X)
+        coords = model.project(X)
+
+        # Jeu de référence: le premier résultat (le plus pertinent en recherche vectorielle)
+        reference_game = df.iloc[0]
+        reference_cluster = int(reference_game['cluster'])
+        reference_name = reference_game['name']
+
+        # Jeux du même thème dans toute la collection (affectations stockées à l'entraînement)
+        cluster_games = profiled_find(
+            collection,
+            {THEME_FIELD: reference_cluster},
+            {'_id': 0, 'name': 1, 'developer': 1, 'positive': 1, 'negative': 1, THEME_FIELD: 1},
+            limit=20,
+            label='ml.theme.same_cluster'
+        )
+    finally:
+        client.close()
+
+    cluster_stats = df.groupby('cluster').agg({
+        'positive': 'mean',
+        'negative': 'mean',
+        'name': 'count'
+    }).round(2)
+    cluster_stats.columns = ['Positive Moyen', 'Negative Moyen', 'Nombre de Jeux']
+
+    # Visualisations
+    fig = Figure(figsize=(14, 5))
+    axes = fig.subplots(1, 2)
+
+    # 1. Projection des résultats sur les deux premiers axes de la PCA
+    scatter = axes[0].scatter(
+        coords[:, 0],
+        coords[:, 1],
+        c=df['cluster'],
+        cmap='viridis',
+        vmin=0,
+        vmax=model.n_clusters - 1,
+        alpha=0.6,
+        s=50,
+        edgecolors='black',
+        linewidth=0.5
+    )
+    axes[0].scatter(
+        coords[0, 0],
+        coords[0, 1],
+        c='red',
+        s=300,
+        marker='*',
+        edgecolors='black',
+        linewidth=2,
+        label=f'Référence: {reference_name[:25]}...' if len(reference_name) > 25 else f'Référence: {reference_name}',
+        zorder=5
+    )
+    axes[0].legend(loc='upper right')
+    axes[0].set_xlabel('Composante 1')
+    axes[0].set_ylabel('Composante 2')
+    axes[0].set_title('Thèmes des Jeux (Embeddings, PCA)')
+    axes[0].grid(alpha=0.3)
+    fig.colorbar(scatter, ax=axes[0], label='Cluster')
+
+    # 2. Répartition des résultats par thème comparée à toute la collection
+    result_share = np.bincount(df['cluster'], minlength=model.n_clusters) / len(df)
+    total_sizes = np.asarray(model.cluster_sizes, dtype=float)
+    collection_share = total_sizes / total_sizes.sum() if total_sizes.sum() > 0 else np.zeros(model.n_clusters)
+    positions = np.arange(model.n_clusters)
+    bars = axes[1].bar(positions - 0.2, result_share, width=0.4, color='skyblue', edgecolor='black', label='Résultats')
+    axes[1].bar(positions + 0.2, collection_share, width=0.4, color='lightgray', edgecolor='black', label='Collection')
+    bars[reference_cluster].set_color('coral')
+    axes[1].set_xlabel('Cluster')
+    axes[1].set_ylabel('Part des Jeux')
+    axes[1].set_title('Répartition des Jeux par Thème')
+    axes[1].set_xticks(positions)
+    axes[1].legend()
+    axes[1].grid(axis='y', alpha=0.3)
+
+    fig.tight_layout()
+
+    # Sauvegarder
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight', dpi=100)
+    buffer.seek(0)
+    image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    buffer.close()
+
+    result = {
+        'model': 'MiniBatch K-Means thématique (embeddings)',
+        'mode': 'embedding',
+        'n_clusters': model.n_clusters,
+        'reference_game': reference_name,
+        'reference_cluster': reference_cluster,
+        'cluster_stats': cluster_stats.to_dict(),
+        'cluster_games': cluster_games,
+        'total_games_analyzed': len(df),
+        'theme_model': {
+            'n_games': model.metadata.get('n_games'),
+            'explained_variance_ratio': model.metadata.get('explained_variance_ratio'),
+            'fitted_at': model.metadata.get('fitted_at'),
+            'cluster_sizes': model.cluster_sizes
+        },
+        'image_base64': image_base64
+    }
+
+    return result, None
+
+
+def warm_up():
+    """
+    Échauffement appelé par le lanceur dans chaque worker avant d'accepter du
+    trafic: entraîne des modèles minuscules et rend une figure pour initialiser
+    sklearn, XGBoost et le cache de polices de matplotlib.
+    """
+    rng = np.random.default_rng(0)
+    X = rng.random((40, 4))
+    y = (X[:, 0] > 0.5).astype(int)
+    RandomForestClassifier(n_estimators=2).fit(X, y)
+    xgb.XGBRegressor(n_estimators=2).fit(X, X[:, 1])
+    KMeans(n_clusters=2, n_init=1).fit(X)
+
+    fig = Figure(figsize=(2, 2))
+    ax = fig.subplots()
+    ax.hist(X[:, 0])
+    ax.set_title('warm-up')
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png')
+    buffer.close()
+
+
 # Routes API
 @app.route('/ml/random-forest', methods=['GET'])
+@conditional_get(data_version)
 def api_random_forest():
     """Route pour la classification Random Forest (Jeux Valve)"""
     search_query = request.args.get('search', None)
-    result, error = classify_valve_games(search_query)
+    try:
+        budget = TrainingBudget.from_request_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result, error = classify_valve_games(search_query, budget)
     if error:
         return jsonify({'error': error}), 500
     return jsonify(result), 200
 
 
 @app.route('/ml/xgboost', methods=['GET'])
+@conditional_get(data_version)
 def api_xgboost():
     """Route pour la prédiction XGBoost (Score de pertinence)"""
     search_query = request.args.get('search', None)
-    result, error = predict_relevance_score(search_query)
+    try:
+        budget = TrainingBudget.from_request_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result, error = predict_relevance_score(search_query, budget)
     if error:
         return jsonify({'error': error}), 500
     return jsonify(result), 200
 
 
 @app.route('/ml/kmeans', methods=['GET'])
+@conditional_get(data_version)
 def api_kmeans():
-    """Route pour le clustering K-Means"""
+    """Route pour le clustering K-Means (mode=reviews par défaut, ou mode=embedding)"""
     search_query = request.args.get('search', None)
-    result, error = cluster_games_kmeans(search_query)
+    mode = request.args.get('mode', 'reviews')
+    if mode not in KMEANS_MODES:
+        return jsonify({'error': f"Mode inconnu: {mode} (modes: {', '.join(KMEANS_MODES)})"}), 400
+    try:
+        budget = TrainingBudget.from_request_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result, error = cluster_games_kmeans(search_query, mode, budget=budget)
     if error:
         return jsonify({'error': error}), 500
     return jsonify(result), 200
 
 
-@app.route('/ml/all', methods=['GET'])
-def api_all_models():
-    """Route pour exécuter tous les modèles ML"""
-    search_query = request.args.get('search', None)
+def run_all_models(search_query, budget, kmeans_mode='reviews', frame=None):
+    """
+    Exécute les trois modèles sur les mêmes jeux: la recherche n'est faite
+    qu'une fois si aucun frame n'est fourni. L'erreur d'un modèle est
+    rapportée dans son entrée sans interrompre les autres.
+    `budget` couvre tout l'appel (recherche comprise): chaque modèle dispose
+    du temps laissé par les précédents, et le total est rapporté dans
+    'training_budget'.
+    """
+    budget.start()
+    if frame is None:
+        games = get_games_data(search_query)
+        frame = prepare_games_frame(games) if games else pd.DataFrame()
+
     results = {}
     
     if search_query:
         results['search_query'] = search_query
     
     # Random Forest
-    rf_result, rf_error = classify_valve_games(search_query)
+    rf_result, rf_error = classify_valve_games(search_query, budget.sub_budget(), frame)
     if rf_error:
         results['random_forest'] = {'error': rf_error}
     else:
         results['random_forest'] = rf_result
     
     # XGBoost
-    xgb_result, xgb_error = predict_relevance_score(search_query)
+    xgb_result, xgb_error = predict_relevance_score(search_query, budget.sub_budget(), frame)
     if xgb_error:
         results['xgboost'] = {'error': xgb_error}
     else:
         results['xgboost'] = xgb_result
     
     # K-Means
-    kmeans_result, kmeans_error = cluster_games_kmeans(search_query)
+    kmeans_result, kmeans_error = cluster_games_kmeans(search_query, kmeans_mode, frame, budget.sub_budget())
     if kmeans_error:
         results['kmeans'] = {'error': kmeans_error}
     else:
         results['kmeans'] = kmeans_result
     
-    return jsonify(results), 200
+    results['training_budget'] = budget.report()
+    return results
+
+
+@app.route('/ml/all', methods=['GET'])
+@conditional_get(data_version)
+def api_all_models():
+    """Route pour exécuter tous les modèles ML (un seul budget partagé par les trois modèles)"""
+    search_query = request.args.get('search', None)
+    try:
+        budget = TrainingBudget.from_request_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    kmeans_mode = request.args.get('mode', 'reviews')
+    if kmeans_mode not in KMEANS_MODES:
+        return jsonify({'error': f"Mode inconnu: {kmeans_mode} (modes: {', '.join(KMEANS_MODES)})"}), 400
+    
+    return jsonify(run_all_models(search_query, budget, kmeans_mode)), 200
+
+
+@app.route('/ml/batch', methods=['POST'])
+def api_batch():
+    """
+    Route batch: tous les modèles pour une liste de recherches ({"queries": [...]}).
+    Les embeddings sont calculés en un appel, les recherches vectorielles en
+    parallèle, et les jeux communs à plusieurs recherches ne sont nettoyés
+    qu'une fois. Les modèles de plusieurs recherches tournent en parallèle
+    (au plus BATCH_MODEL_WORKERS, coeurs du budget répartis entre eux).
+    Les résultats sont envoyés en NDJSON, une ligne par recherche dès qu'elle
+    est terminée (dans un ordre quelconque, repérée par 'index'), puis une
+    ligne de synthèse ('done', avec 'error' si la recherche du lot a échoué).
+    Paramètres budget_ms, cpu et mode comme /ml/all; budget_ms s'applique à
+    chaque recherche du lot.
+    """
+    data = request.get_json(silent=True) or {}
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+        return jsonify({'error': "'queries' doit être une liste non vide de recherches"}), 400
+    if len(queries) > BATCH_MAX_QUERIES:
+        return jsonify({'error': f"Trop de recherches ({len(queries)}, maximum {BATCH_MAX_QUERIES})"}), 400
+    try:
+        TrainingBudget.from_request_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    kmeans_mode = request.args.get('mode', 'reviews')
+    if kmeans_mode not in KMEANS_MODES:
+        return jsonify({'error': f"Mode inconnu: {kmeans_mode} (modes: {', '.join(KMEANS_MODES)})"}), 400
+    budget_args = request.args.copy()
+
+    def generate():
+        start = time.perf_counter()
+        print(f"Lot de {len(queries)} recherches")
+        try:
+            frames, unique_games = build_batch_frames(get_games_data_batch(queries))
+        except Exception as e:
+            # La réponse est déjà partie en 200: l'erreur est signalée dans le flux
+            print(f"Erreur lors de la recherche du lot: {e}")
+            yield app.json.dumps({'done': True, 'queries': len(queries),
+                                  'error': f"Erreur lors de la recherche du lot: {e}"}) + '\n'
+            return
+        search_ms = (time.perf_counter() - start) * 1000
+
+        # Modèles de plusieurs recherches en parallèle (les figures sont propres à
+        # chaque appel): les coeurs du budget sont répartis entre les workers
+        budget = TrainingBudget.from_request_args(budget_args)
+        n_workers = max(1, min(BATCH_MODEL_WORKERS, len(queries), budget.n_jobs))
+        cpu_per_query = max(1, budget.n_jobs // n_workers)
+
+        def run_query(index):
+            search_query, frame = queries[index], frames[index]
+            try:
+                results = run_all_models(
+                    search_query,
+                    TrainingBudget(budget.time_budget_ms, cpu_per_query),
+                    kmeans_mode,
+                    frame if frame is not None else pd.DataFrame()
+                )
+            except Exception as e:
+                print(f"Erreur pour la recherche '{search_query}': {e}")
+                results = {'search_query': search_query, 'error': str(e)}
+            results['index'] = index
+            return results
+
+        executor = ThreadPoolExecutor(max_workers=n_workers)
+        try:
+            futures = [executor.submit(run_query, index) for index in range(len(queries))]
+            # Chaque ligne porte son 'index': envoyée dès que sa recherche est terminée
+            for future in as_completed(futures):
+                yield app.json.dumps(future.result()) + '\n'
+        finally:
+            # Client déconnecté: les recherches pas encore commencées sont annulées
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        yield app.json.dumps({
+            'done': True,
+            'queries': len(queries),
+            'unique_games': unique_games,
+            'total_games': int(sum(len(frame) for frame in frames if frame is not None)),
+            'timings_ms': {
+                'search': round(search_ms, 1),
+                'total': round((time.perf_counter() - start) * 1000, 1)
+            }
+        }) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 
 if __name__ == '__main__':
@@ -593,6 +968,10 @@ if __name__ == '__main__':
     print("  GET /ml/xgboost - XGBoost")
     print("  GET /ml/kmeans - K-Means")
     print("  GET /ml/all - Tous les modèles")
+    print("  POST /ml/batch - Tous les modèles pour une liste de recherches (NDJSON)")
+    print("  Paramètres: search, budget_ms (budget d'entraînement de la requête,")
+    print("              partagé par les modèles de /ml/all), cpu (coeurs),")
+    print("              mode=embedding (K-Means thématique sur les embeddings)")
     print("\nDémarrage du service sur http://localhost:5002")
     print("=" * 60)
     app.run(host='0.0.0.0', port=5002, debug=True)
@@ -0,0 +1,308 @@
+#query_profiler.py
+"""
+Profilage des requêtes MongoDB des services (mode opt-in).
+
+Avec QUERY_PROFILING=1, chaque forme de requête distincte (filtre/pipeline
+dont les valeurs sont remplacées par leur type) est passée une fois par
+processus à `explain` (verbosité executionStats) et son résumé est écrit
+dans le journal JSONL QUERY_PROFILE_LOG: documents examinés / retournés,
+index utilisé, temps par étape. Les requêtes plus lentes que SLOW_QUERY_MS
+sont aussi journalisées.
+
+Rapport et recommandations d'index:
+    python py/query_profiler.py report [--log query_profile.jsonl]
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+PROFILING_ENABLED = os.getenv("QUERY_PROFILING", "0") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+PROFILE_LOG = os.getenv("QUERY_PROFILE_LOG", "query_profile.jsonl")
+
+# Champs vectoriels connus: un index classique sur ces tableaux serait multikey
+VECTOR_FIELDS = {'combined_embedding'}
+# Marqueur scalaire écrit avec l'embedding par embedding_generation.py
+EMBEDDING_MODEL_FIELD = 'embedding_model'
+
+# Opérateurs dont la valeur fait partie de la forme de la requête
+STRUCTURAL_OPERATORS = {'$exists', '$type', '$options', '$meta'}
+# Opérateurs dont la valeur est une liste de valeurs (une seule forme quelle que soit sa longueur)
+ARRAY_OPERATORS = {'$in', '$nin', '$all'}
+# Clés dont la valeur est un vecteur de requête ($vectorSearch)
+VECTOR_KEYS = {'queryVector'}
+RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte', '$ne', '$nin', '$exists', '$type', '$regex', '$not'}
+
+_explained_shapes = set()
+_log_lock = threading.Lock()
+
+
+def _normalize(value, key=None):
+    """Remplace les valeurs littérales par leur type pour obtenir la forme de la requête"""
+    if isinstance(value, dict):
+        return {k: _normalize(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if key in VECTOR_KEYS:
+            return f'<vector[{len(value)}]>'
+        # Pipeline, $and/$or: listes de sous-requêtes dont la structure compte
+        if key not in ARRAY_OPERATORS and value and all(isinstance(v, dict) for v in value):
+            return [_normalize(v) for v in value]
+        # Valeurs de $in, $nin, $all, tableaux littéraux: la longueur ne change pas la forme
+        return '<array>'
+    if key in STRUCTURAL_OPERATORS:
+        return value
+    if isinstance(value, str) and value.startswith('$'):
+        return value  # référence de champ dans $project
+    return f'<{type(value).__name__}>'
+
+
+def query_shape(kind, collection_name, query, projection=None, limit=0):
+    """Forme normalisée d'une requête et son identifiant court"""
+    shape = {'kind': kind, 'collection': collection_name}
+    if kind == 'find':
+        shape['filter'] = _normalize(query)
+        shape['projection'] = projection
+        shape['limit'] = limit
+    else:
+        shape['pipeline'] = _normalize(query)
+    shape_id = hashlib.sha1(json.dumps(shape, sort_keys=True, default=str).encode()).hexdigest()[:12]
+    return shape, shape_id
+
+
+def _write_record(record):
+    record['timestamp'] = datetime.now(timezone.utc).isoformat()
+    line = json.dumps(record, default=str)
+    with _log_lock:
+        with open(PROFILE_LOG, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+def _collect_stages(node, stages):
+    """Parcourt un arbre executionStages (find) en pré-ordre"""
+    if not isinstance(node, dict):
+        return
+    stages.append({
+        'stage': node.get('stage'),
+        'index': node.get('indexName'),
+        'time_ms': node.get('executionTimeMillisEstimate'),
+        'n_returned': node.get('nReturned'),
+        'docs_examined': node.get('docsExamined'),
+        'keys_examined': node.get('keysExamined')
+    })
+    for child_key in ('inputStage', 'innerStage', 'outerStage'):
+        _collect_stages(node.get(child_key), stages)
+    for child in node.get('inputStages', []):
+        _collect_stages(child, stages)
+
+
+def summarize_explain(explain):
+    """Résumé compact d'une sortie d'explain (find ou aggregate)"""
+    summary = {'docs_examined': None, 'keys_examined': None, 'n_returned': None,
+               'execution_time_ms': None, 'indexes_used': [], 'collscan': False, 'stages': []}
+
+    # Un aggregate dont le début est délégué au moteur de requêtes place
+    # queryPlanner/executionStats dans l'étape $cursor
+    execution_stats = explain.get('executionStats')
+    pipeline_stages = explain.get('stages', [])
+    for stage in pipeline_stages:
+        if '$cursor' in stage:
+            execution_stats = stage['$cursor'].get('executionStats', execution_stats)
+
+    if execution_stats:
+        summary['docs_examined'] = execution_stats.get('totalDocsExamined')
+        summary['keys_examined'] = execution_stats.get('totalKeysExamined')
+        summary['n_returned'] = execution_stats.get('nReturned')
+        summary['execution_time_ms'] = execution_stats.get('executionTimeMillis')
+        _collect_stages(execution_stats.get('executionStages'), summary['stages'])
+
+    for stage in pipeline_stages:
+        name = next((k for k in stage if k.startswith('$')), None)
+        if name and name != '$cursor':
+            summary['stages'].append({
+                'stage': name,
+                'time_ms': stage.get('executionTimeMillisEstimate'),
+                'n_returned': stage.get('nReturned')
+            })
+
+    for stage in summary['stages']:
+        if stage.get('index'):
+            summary['indexes_used'].append(stage['index'])
+        if stage.get('stage') == 'COLLSCAN':
+            summary['collscan'] = True
+    summary['indexes_used'] = sorted(set(summary['indexes_used']))
+    return summary
+
+
+def _explain(collection, kind, query, projection, limit):
+    if kind == 'find':
+        command = {'find': collection.name, 'filter': query}
+        if projection:
+            command['projection'] = projection
+        if limit:
+            command['limit'] = limit
+    else:
+        command = {'aggregate': collection.name, 'pipeline': query, 'cursor': {}}
+    return collection.database.command({'explain': command, 'verbosity': 'executionStats'})
+
+
+def _profile(collection, kind, query, projection, limit, label, duration_ms):
+    shape, shape_id = query_shape(kind, collection.name, query, projection, limit)
+    base = {'label': label, 'shape_id': shape_id, 'shape': shape}
+
+    if shape_id not in _explained_shapes:
+        _explained_shapes.add(shape_id)
+        try:
+            summary = summarize_explain(_explain(collection, kind, query, projection, limit))
+            _write_record(dict(base, type='explain', duration_ms=round(duration_ms, 1), summary=summary))
+        except Exception as e:
+            print(f"Profilage: explain impossible pour {label}: {e}")
+
+    if duration_ms >= SLOW_QUERY_MS:
+        print(f"Requête lente ({duration_ms:.0f} ms >= {SLOW_QUERY_MS:.0f} ms): {label} [{shape_id}]")
+        _write_record(dict(base, type='slow', duration_ms=round(duration_ms, 1)))
+
+
+def profiled_find(collection, query, projection=None, limit=0, label='find'):
+    """Exécute un find et retourne la liste des documents (profilé si activé)"""
+    start = time.perf_counter()
+    cursor = collection.find(query, projection)
+    if limit:
+        cursor = cursor.limit(limit)
+    documents = list(cursor)
+    if PROFILING_ENABLED:
+        _profile(collection, 'find', query, projection, limit, label, (time.perf_counter() - start) * 1000)
+    return documents
+
+
+def profiled_aggregate(collection, pipeline, label='aggregate'):
+    """Exécute un pipeline d'agrégation et retourne la liste des documents (profilé si activé)"""
+    start = time.perf_counter()
+    documents = list(collection.aggregate(pipeline))
+    if PROFILING_ENABLED:
+        _profile(collection, 'aggregate', pipeline, None, 0, label, (time.perf_counter() - start) * 1000)
+    return documents
+
+
+# Rapport en ligne de commande
+
+def _filter_of(shape):
+    """Filtre servi par le moteur de requêtes: filtre du find ou premier $match du pipeline"""
+    if shape['kind'] == 'find':
+        return shape.get('filter') or {}
+    pipeline = shape.get('pipeline') or []
+    if pipeline and '$match' in pipeline[0]:
+        return pipeline[0]['$match']
+    return {}
+
+
+def recommend_index(shape):
+    """
+    Propose un index pour une forme de requête en ordre ESR
+    (champs d'égalité, puis champs de plage). Retourne (spec, note) ou None.
+    """
+    query_filter = _filter_of(shape)
+    equality, ranges, vector_fields = [], [], []
+    for field, condition in query_filter.items():
+        if field.startswith('$'):
+            continue
+        if isinstance(condition, dict) and any(op in RANGE_OPERATORS for op in condition):
+            if field in VECTOR_FIELDS:
+                vector_fields.append(field)
+            else:
+                ranges.append(field)
+        else:
+            equality.append(field)
+
+    fields = equality + ranges
+    note = None
+    if any(isinstance(c, dict) and '$regex' in c for c in query_filter.values()):
+        note = ("regex non ancrée ou insensible à la casse: l'index ne fait que remplacer le parcours "
+                "des documents par celui des clés; un index Atlas Search servirait mieux la recherche par nom.")
+    if vector_fields:
+        note = (f"{', '.join(vector_fields)} est un tableau de flottants: un index dessus serait multikey "
+                f"(une clé par composante) et n'est pas proposé. Pour sélectionner les documents avec ou "
+                f"sans embedding, filtrer sur le marqueur '{EMBEDDING_MODEL_FIELD}' écrit par "
+                f"embedding_generation.py.")
+    if not fields:
+        return None
+    return [(field, 1) for field in fields], note
+
+
+def load_records(path):
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def report(path):
+    records = load_records(path)
+    by_shape = defaultdict(lambda: {'explain': None, 'slow': [], 'labels': set()})
+    for record in records:
+        entry = by_shape[record['shape_id']]
+        entry['shape'] = record['shape']
+        entry['labels'].add(record.get('label'))
+        if record['type'] == 'explain':
+            entry['explain'] = record
+        elif record['type'] == 'slow':
+            entry['slow'].append(record['duration_ms'])
+
+    print(f"{len(by_shape)} formes de requêtes dans {path}\n")
+    recommendations = []
+    for shape_id, entry in sorted(by_shape.items(), key=lambda item: -max(item[1]['slow'] or [0])):
+        shape = entry['shape']
+        print(f"[{shape_id}] {shape['kind']} sur {shape['collection']} ({', '.join(sorted(filter(None, entry['labels'])))})")
+        if entry['slow']:
+            print(f"  lente {len(entry['slow'])} fois, max {max(entry['slow']):.0f} ms, "
+                  f"moy {sum(entry['slow']) / len(entry['slow']):.0f} ms")
+
+        summary = (entry['explain'] or {}).get('summary')
+        if not summary:
+            print("  pas de plan d'exécution enregistré\n")
+            continue
+        examined, returned = summary.get('docs_examined'), summary.get('n_returned')
+        ratio = f" (ratio {examined / returned:.1f})" if examined and returned else ''
+        print(f"  documents examinés: {examined}, retournés: {returned}{ratio}, "
+              f"clés examinées: {summary.get('keys_examined')}")
+        print(f"  index: {', '.join(summary['indexes_used']) or 'aucun'}"
+              f"{' (COLLSCAN)' if summary['collscan'] else ''}")
+        for stage in summary['stages']:
+            print(f"    - {stage['stage']}: {stage.get('time_ms')} ms, {stage.get('n_returned')} retournés")
+
+        if summary['collscan']:
+            recommendation = recommend_index(shape)
+            if recommendation:
+                recommendations.append((shape_id, shape['collection']) + recommendation)
+        print()
+
+    if recommendations:
+        print("Index recommandés:")
+        for shape_id, collection_name, spec, note in recommendations:
+            print(f"  [{shape_id}] db.{collection_name}.create_index({spec})")
+            if note:
+                print(f"      note: {note}")
+    else:
+        print("Aucun index manquant détecté.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapport du profilage des requêtes MongoDB")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    report_parser = subparsers.add_parser('report', help="Résumé par forme de requête et index recommandés")
+    report_parser.add_argument('--log', default=PROFILE_LOG, help="Journal JSONL du profilage")
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        report(args.log)
+
+
+if __name__ == '__main__':
+    main()
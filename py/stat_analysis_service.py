@@ -2,12 +2,15 @@ from pymongo import MongoClient
 import numpy as np
 import matplotlib
 matplotlib.use('Agg') 
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from scipy.stats import norm
 from io import BytesIO
 import base64
 import os
 from dotenv import load_dotenv
+from query_profiler import profiled_aggregate
+from http_cache import DataVersion, conditional_get
+from distribution_fit import fit_distributions, fitted_cdf, subsample_sorted
 
 # Configuration
 load_dotenv()
@@ -20,8 +23,10 @@ VARIABLE_TO_ANALYZE = 'positive'
 def calculate_n_plot_statistics():
     """
     Connecte à MongoDB, récupère les données pour la variable spécifiée,
-    calcule les statistiques et génère un graphique de distribution.
-    Retourne les statistiques et le graphique encodé en base64.
+    calcule les statistiques, ajuste plusieurs lois candidates (normale,
+    log-normale, exponentielle, queue en loi de puissance) et génère un
+    graphique de distribution.
+    Retourne le graphique encodé en base64, les statistiques et l'erreur éventuelle.
     """
     try:
         client = MongoClient(MONGO_URI)
@@ -32,41 +37,54 @@ def calculate_n_plot_statistics():
             {'$match': { VARIABLE_TO_ANALYZE: {'$type': 'number', '$gte': 0}}},
             {'$project': {'_id': 0, 'value': f'${VARIABLE_TO_ANALYZE}'}}
         ]
-        data = [doc['value'] for doc in collection.aggregate(pipeline)]
-        if not data:
-            return None, "Aucune donnée disponible pour l'analyse."
-        
+        documents = profiled_aggregate(collection, pipeline, label='statistics.values')
         client.close()
+        if not documents:
+            return None, None, "Aucune donnée disponible pour l'analyse."
     except Exception as e:
-        return None, f"Erreur lors de la connexion à MongoDB ou récupération des données: {e}"
+        return None, None, f"Erreur lors de la connexion à MongoDB ou récupération des données: {e}"
     
-    # Convertir les données en numpy array
-    x = np.array(data)
+    # Convertir les données en numpy array (sans liste Python intermédiaire)
+    x = np.fromiter((doc['value'] for doc in documents), dtype=np.float64, count=len(documents))
     x.sort()
     n = len(x)
+    mu, std = x.mean(), x.std()
 
-    # Calculer l'EDF empirique
-    y_edf = np.arange(1, n + 1) / n
+    # Ajuster les lois candidates (tests KS / Anderson-Darling vectorisés)
+    goodness_of_fit = fit_distributions(x)
 
-    # Calculer la CDF théorique (normale)
-    mu, std = x.mean(), x.std()
-    y_cdf = norm.cdf(x, loc=mu, scale=std)
+    # Le graphique utilise un sous-échantillon de quantiles: son coût ne dépend plus de n
+    x_plot = subsample_sorted(x, 2000)
+    y_edf = np.searchsorted(x, x_plot, side='right') / n
 
-    # Générer le graphique
-    plt.figure(figsize=(10, 6))
-    plt.plot(x, y_edf, marker='.', linestyle='none', label='EDF (Empirique)', markersize=4, alpha=0.7)
-    plt.plot(x, y_cdf, color='red', label='CDF (Normale)', linestyle='-', linewidth=2)
-    plt.title(f'Fonctions de Distribution Empirique vs Théorique pour "{VARIABLE_TO_ANALYZE}"')
-    plt.xlabel(VARIABLE_TO_ANALYZE)
-    plt.ylabel('Probabilité Cumultative')
-    plt.xlim(0, 800000)  # Limiter l'axe X à 800000
-    plt.legend()
-    plt.grid(True, linestyle='--', alpha=0.6)
+    # Générer le graphique (une figure par requête: l'état global de pyplot n'est pas thread-safe)
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.plot(x_plot, y_edf, marker='.', linestyle='none', label='EDF (Empirique)', markersize=4, alpha=0.7)
+    colors = {'normal': 'red', 'lognormal': 'green', 'exponential': 'purple', 'power_law_tail': 'orange'}
+    labels = {'normal': 'Normale', 'lognormal': 'Log-normale', 'exponential': 'Exponentielle',
+              'power_law_tail': 'Loi de puissance (queue)'}
+    for fit in goodness_of_fit['fits']:
+        name = fit['distribution']
+        best = name == goodness_of_fit['best']
+        ax.plot(x_plot, fitted_cdf(fit, x_plot), color=colors[name], linestyle='-', linewidth=3 if best else 1.5,
+                label=f"CDF ({labels[name]}, KS={fit['ks']:.3f}){' - meilleure' if best else ''}")
+    tail = goodness_of_fit['power_law_tail']
+    if tail is not None:
+        # Ajustement de la queue seule: tracé à partir de xmin, KS conditionnel à x >= xmin
+        x_tail = x_plot[x_plot >= tail['params']['xmin']]
+        ax.plot(x_tail, fitted_cdf(tail, x_tail), color=colors['power_law_tail'], linestyle='--', linewidth=1.5,
+                label=f"CDF ({labels['power_law_tail']}, KS queue={tail['ks']:.3f})")
+    ax.set_title(f'Fonctions de Distribution Empirique vs Théorique pour "{VARIABLE_TO_ANALYZE}"')
+    ax.set_xlabel(VARIABLE_TO_ANALYZE)
+    ax.set_ylabel('Probabilité Cumultative')
+    ax.set_xlim(0, 800000)  # Limiter l'axe X à 800000
+    ax.legend()
+    ax.grid(True, linestyle='--', alpha=0.6)
 
     # Sauvegarder le graphique dans un buffer
     buffer = BytesIO()
-    plt.savefig(buffer, format='png', bbox_inches='tight')
-    plt.close()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
     buffer.seek(0)
 
     # Encoder le graphique en base64
@@ -80,16 +98,31 @@ def calculate_n_plot_statistics():
         'std_dev': float(std),
         'min': float(x.min()),
         'max': float(x.max()),
-        'count': int(n)
+        'count': int(n),
+        'goodness_of_fit': goodness_of_fit
     }
 
     return image_base64, stats, None
 
+def warm_up():
+    """
+    Échauffement appelé par le lanceur dans chaque worker avant d'accepter du
+    trafic: rend une petite figure pour initialiser le cache de polices.
+    """
+    x = np.sort(np.random.default_rng(0).random(100))
+    fig = Figure(figsize=(2, 2))
+    fig.subplots().plot(x, norm.cdf(x, loc=x.mean(), scale=x.std()))
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png')
+    buffer.close()
+
 # Flask API
 from flask import Flask, jsonify
 app = Flask(__name__)
+data_version = DataVersion(MONGO_URI, DB_NAME, COLLECTION_NAME)
 
 @app.route('/statistics', methods=['GET'])
+@conditional_get(data_version)
 def get_statistics():
     """
     Route API qui retourne les statistiques et le graphique de distribution
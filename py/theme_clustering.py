@@ -0,0 +1,304 @@
+#theme_clustering.py
+"""
+Clustering thématique des jeux sur leurs embeddings (`combined_embedding`).
+
+L'entraînement parcourt la collection par lots sans la charger en mémoire:
+  1. IncrementalPCA (384 -> N_COMPONENTS dimensions) en partial_fit
+  2. MiniBatchKMeans en partial_fit sur les lots projetés
+  3. écriture du cluster de chaque jeu (champ `theme_cluster`)
+Le modèle (moyenne et axes de la PCA, centroïdes) est stocké dans la
+collection `theme_models`. Les centroïdes sont aussi conservés dans
+l'espace d'origine: un nouveau jeu est affecté en O(k·d) sans projection.
+
+Usage:
+    python py/theme_clustering.py fit [--clusters 8]
+    python py/theme_clustering.py bench [--sizes 10000,100000]
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pymongo
+from dotenv import load_dotenv
+from pymongo import MongoClient
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import IncrementalPCA
+from sklearn.preprocessing import StandardScaler
+
+from data_versions import bump_data_version
+
+# Configuration
+load_dotenv()
+MONGO_URI = os.getenv("MONGODB_URI")
+DB_NAME = 'steam_data'
+COLLECTION_NAME = 'games'
+MODEL_COLLECTION_NAME = 'theme_models'
+EMBEDDING_FIELD = 'combined_embedding'
+THEME_FIELD = 'theme_cluster'
+
+N_CLUSTERS = 8
+N_COMPONENTS = 32
+BATCH_SIZE = 2048
+KMEANS_EPOCHS = 2
+
+
+class ThemeModel:
+    """Modèle thématique: PCA incrémentale + centroïdes (réduits et dans l'espace d'origine)"""
+
+    def __init__(self, pca_mean, pca_components, centroids, cluster_sizes=None, metadata=None):
+        self.pca_mean = np.asarray(pca_mean, dtype=np.float32)
+        self.pca_components = np.asarray(pca_components, dtype=np.float32)
+        # Centroïdes ramenés dans l'espace des embeddings: la distance à un centroïde
+        # situé dans le sous-espace de la PCA ne diffère de la distance projetée que
+        # par le résidu du point, identique pour tous les centroïdes
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self._centroid_sq_norms = (self.centroids ** 2).sum(axis=1)
+        self.cluster_sizes = cluster_sizes or [0] * len(self.centroids)
+        self.metadata = metadata or {}
+
+    @property
+    def n_clusters(self):
+        return len(self.centroids)
+
+    def assign(self, embeddings):
+        """Cluster le plus proche de chaque embedding (argmin ||x - c||², O(k·d) par jeu)"""
+        X = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        distances = self._centroid_sq_norms[None, :] - 2 * X @ self.centroids.T
+        return distances.argmin(axis=1)
+
+    def project(self, embeddings, n_components=2):
+        """Coordonnées sur les premiers axes de la PCA (visualisation)"""
+        X = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        return (X - self.pca_mean) @ self.pca_components[:n_components].T
+
+    def to_document(self):
+        document = {
+            '_id': EMBEDDING_FIELD,
+            'pca_mean': self.pca_mean.tolist(),
+            'pca_components': self.pca_components.tolist(),
+            'centroids': self.centroids.tolist(),
+            'cluster_sizes': [int(size) for size in self.cluster_sizes]
+        }
+        document.update(self.metadata)
+        return document
+
+    @classmethod
+    def from_document(cls, document):
+        metadata = {k: v for k, v in document.items()
+                    if k not in ('_id', 'pca_mean', 'pca_components', 'centroids', 'cluster_sizes')}
+        return cls(document['pca_mean'], document['pca_components'], document['centroids'],
+                   document.get('cluster_sizes'), metadata)
+
+
+def iter_embedding_batches(collection, batch_size=BATCH_SIZE):
+    """Parcourt les jeux ayant un embedding par lots (ids, matrice float32)"""
+    cursor = collection.find({EMBEDDING_FIELD: {'$exists': True}}, {EMBEDDING_FIELD: 1}).batch_size(batch_size)
+    ids, vectors = [], []
+    for doc in cursor:
+        ids.append(doc['_id'])
+        vectors.append(doc[EMBEDDING_FIELD])
+        if len(ids) == batch_size:
+            yield ids, np.asarray(vectors, dtype=np.float32)
+            ids, vectors = [], []
+    if ids:
+        yield ids, np.asarray(vectors, dtype=np.float32)
+
+
+def _rebatch(batches, min_size):
+    """Fusionne un dernier lot trop petit avec le précédent (partial_fit exige min_size lignes)"""
+    pending = None
+    for _, X in batches:
+        if pending is not None and (len(X) < min_size or len(pending) < min_size):
+            pending = np.vstack([pending, X])
+            continue
+        if pending is not None:
+            yield pending
+        pending = X
+    if pending is not None:
+        yield pending
+
+
+def fit_theme_model(batch_source, n_clusters=N_CLUSTERS, n_components=N_COMPONENTS,
+                    epochs=KMEANS_EPOCHS, random_state=42):
+    """
+    Entraîne le modèle thématique en flux. `batch_source` est une fonction sans
+    argument qui retourne un nouvel itérateur de lots (ids, matrice) à chaque passe.
+    """
+    start = time.perf_counter()
+    min_rows = max(n_components, n_clusters)
+
+    pca = IncrementalPCA(n_components=n_components)
+    n_games = 0
+    for X in _rebatch(batch_source(), min_rows):
+        if len(X) < min_rows:
+            n_games += len(X)
+            break
+        pca.partial_fit(X)
+        n_games += len(X)
+    if n_games < min_rows:
+        raise ValueError(f"Pas assez de jeux avec embedding ({n_games}, minimum {min_rows})")
+
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, n_init=3)
+    for _ in range(epochs):
+        for X in _rebatch(batch_source(), min_rows):
+            kmeans.partial_fit(pca.transform(X))
+
+    centroids = kmeans.cluster_centers_ @ pca.components_ + pca.mean_
+    metadata = {
+        'n_clusters': n_clusters,
+        'n_components': n_components,
+        'n_games': n_games,
+        'explained_variance_ratio': float(pca.explained_variance_ratio_.sum()),
+        'fit_seconds': round(time.perf_counter() - start, 2),
+        'fitted_at': datetime.now(timezone.utc).isoformat()
+    }
+    return ThemeModel(pca.mean_, pca.components_, centroids, metadata=metadata)
+
+
+def assign_collection(collection, model, batch_size=BATCH_SIZE):
+    """Écrit le cluster thématique de chaque jeu; retourne la taille des clusters"""
+    sizes = np.zeros(model.n_clusters, dtype=int)
+    for ids, X in iter_embedding_batches(collection, batch_size):
+        labels = model.assign(X)
+        sizes += np.bincount(labels, minlength=model.n_clusters)
+        collection.bulk_write([
+            pymongo.UpdateOne({'_id': _id}, {'$set': {THEME_FIELD: int(label)}})
+            for _id, label in zip(ids, labels)
+        ])
+    return sizes.tolist()
+
+
+def save_theme_model(db, model):
+    db[MODEL_COLLECTION_NAME].replace_one({'_id': EMBEDDING_FIELD}, model.to_document(), upsert=True)
+
+
+# Modèle chargé par processus (base -> ThemeModel), rechargé quand `fitted_at` change
+_model_cache = {}
+
+
+def load_theme_model(db):
+    """
+    Modèle thématique stocké. Seuls `fitted_at` et `cluster_sizes` sont relus à
+    chaque appel: le document complet (axes de la PCA, centroïdes) n'est relu et
+    décodé qu'après un nouvel entraînement.
+    """
+    header = db[MODEL_COLLECTION_NAME].find_one({'_id': EMBEDDING_FIELD}, {'fitted_at': 1, 'cluster_sizes': 1})
+    if header is None:
+        return None
+    model = _model_cache.get(db.name)
+    if model is None or model.metadata.get('fitted_at') != header.get('fitted_at'):
+        document = db[MODEL_COLLECTION_NAME].find_one({'_id': EMBEDDING_FIELD})
+        if document is None:
+            return None
+        model = ThemeModel.from_document(document)
+        _model_cache[db.name] = model
+    model.cluster_sizes = header.get('cluster_sizes') or model.cluster_sizes
+    return model
+
+
+def add_to_cluster_sizes(db, labels, n_clusters):
+    """Ajoute des jeux nouvellement affectés aux tailles de clusters du modèle stocké"""
+    counts = np.bincount(np.asarray(labels, dtype=int), minlength=n_clusters)
+    increments = {f'cluster_sizes.{i}': int(count) for i, count in enumerate(counts) if count}
+    if increments:
+        db[MODEL_COLLECTION_NAME].update_one({'_id': EMBEDDING_FIELD}, {'$inc': increments})
+
+
+def fit_and_store(n_clusters=N_CLUSTERS, n_components=N_COMPONENTS, batch_size=BATCH_SIZE):
+    """Entraîne le modèle sur toute la collection, affecte les jeux et stocke le modèle"""
+    client = MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+    collection = db[COLLECTION_NAME]
+    try:
+        print("Entraînement du modèle thématique (PCA incrémentale + MiniBatchKMeans)...")
+        model = fit_theme_model(lambda: iter_embedding_batches(collection, batch_size), n_clusters, n_components)
+        print(f"Modèle entraîné sur {model.metadata['n_games']} jeux en {model.metadata['fit_seconds']}s "
+              f"(variance expliquée: {model.metadata['explained_variance_ratio']:.1%})")
+
+        print("Affectation des jeux aux clusters...")
+        model.cluster_sizes = assign_collection(collection, model, batch_size)
+        save_theme_model(db, model)
+        # Après l'enregistrement du modèle: une réponse mise en cache avec la nouvelle
+        # version ne peut pas mélanger les nouveaux clusters et les anciens centroïdes
+        bump_data_version(collection)
+        print(f"Modèle stocké dans {MODEL_COLLECTION_NAME}. Taille des clusters: {model.cluster_sizes}")
+    finally:
+        client.close()
+
+
+# Benchmark: chemin actuel (avis, KMeans complet) vs embeddings en flux
+
+def _synthetic_embeddings(n_games, dimension=384, n_themes=N_CLUSTERS, seed=0):
+    """Générateur de lots d'embeddings synthétiques groupés autour de thèmes"""
+    rng = np.random.default_rng(seed)
+    themes = rng.standard_normal((n_themes, dimension)).astype(np.float32)
+    for start in range(0, n_games, BATCH_SIZE):
+        size = min(BATCH_SIZE, n_games - start)
+        X = themes[rng.integers(0, n_themes, size)] + 0.8 * rng.standard_normal((size, dimension)).astype(np.float32)
+        yield list(range(start, start + size)), X / np.linalg.norm(X, axis=1, keepdims=True)
+
+
+def _current_path(n_games, seed=0):
+    """Reproduit cluster_games_kmeans: 4 features d'avis, méthode du coude puis KMeans(5)"""
+    rng = np.random.default_rng(seed)
+    positive = np.floor(rng.lognormal(5, 2.2, n_games))
+    negative = np.floor(positive * rng.beta(2, 8, n_games))
+    total = positive + negative
+    ratio = np.divide(positive, total, out=np.zeros_like(total), where=total > 0)
+    X = StandardScaler().fit_transform(np.column_stack([positive, negative, total, ratio]))
+    for k in range(2, min(11, n_games // 10)):
+        KMeans(n_clusters=k, random_state=42, n_init=10).fit(X)
+    KMeans(n_clusters=5, random_state=42, n_init=10).fit(X)
+
+
+def _full_batch_embeddings(n_games, seed=0):
+    """KMeans complet sur les embeddings chargés en mémoire (alternative naïve)"""
+    X = np.vstack([batch for _, batch in _synthetic_embeddings(n_games, seed=seed)])
+    KMeans(n_clusters=N_CLUSTERS, random_state=42, n_init=1).fit(X)
+
+
+def _measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 ** 2
+
+
+def benchmark(sizes):
+    paths = [
+        ('actuel (avis, KMeans + coude)', _current_path),
+        ('embeddings, KMeans complet', _full_batch_embeddings),
+        ('embeddings, IPCA + MiniBatch', lambda n: fit_theme_model(lambda: _synthetic_embeddings(n))),
+    ]
+    print(f"{'chemin':<32} {'jeux':>8} {'temps (s)':>10} {'pic mémoire (Mo)':>17}")
+    for n_games in sizes:
+        for label, function in paths:
+            elapsed, peak_mb = _measure(lambda: function(n_games))
+            print(f"{label:<32} {n_games:>8} {elapsed:>10.2f} {peak_mb:>17.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clustering thématique des jeux sur leurs embeddings")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    fit_parser = subparsers.add_parser('fit', help="Entraîner, affecter les jeux et stocker le modèle")
+    fit_parser.add_argument('--clusters', type=int, default=N_CLUSTERS)
+    fit_parser.add_argument('--components', type=int, default=N_COMPONENTS)
+    fit_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    bench_parser = subparsers.add_parser('bench', help="Comparer temps et mémoire au chemin actuel")
+    bench_parser.add_argument('--sizes', default='10000,100000')
+    args = parser.parse_args()
+
+    if args.command == 'fit':
+        fit_and_store(args.clusters, args.components, args.batch_size)
+    elif args.command == 'bench':
+        benchmark([int(size) for size in args.sizes.split(',')])
+
+
+if __name__ == '__main__':
+    main()
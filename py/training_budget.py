@@ -0,0 +1,246 @@
+#training_budget.py
+"""
+Contrôle du coût d'entraînement des modèles ML par requête.
+
+Un `TrainingBudget` fixe un temps maximal (ms) et un nombre de coeurs.
+Les forêts sont agrandies par paliers (warm start) tant que le score
+out-of-bag progresse et que le budget le permet; le boosting s'arrête sur
+une validation (early stopping) ou dès que le budget est épuisé; K-Means
+enchaîne ses initialisations tant que le budget le permet.
+Plusieurs modèles d'une même requête se partagent un budget (voir
+`sub_budget`): chacun dispose du temps laissé par les précédents.
+Le rapport du budget est renvoyé dans la réponse de l'API.
+"""
+import os
+import time
+import warnings
+
+import numpy as np
+import xgboost as xgb
+from sklearn.cluster import KMeans
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.utils.class_weight import compute_class_weight
+
+DEFAULT_TIME_BUDGET_MS = int(os.getenv("TRAINING_BUDGET_MS", "2000"))
+MAX_TIME_BUDGET_MS = 30000
+
+# En dessous de ce nombre de lignes, l'algorithme exact de XGBoost est aussi
+# rapide que l'histogramme et évite la quantification des features
+EXACT_TREE_METHOD_MAX_ROWS = 5000
+
+
+def default_n_jobs(cpu_count=None):
+    """
+    Coeurs par défaut d'un entraînement. Sous le lanceur multi-workers,
+    OMP_NUM_THREADS donne la part de coeurs du worker; seule la première
+    valeur d'une liste OpenMP ("4,2") est retenue, et une valeur invalide
+    revient au nombre de coeurs.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    try:
+        n_jobs = int(os.getenv("OMP_NUM_THREADS", "").split(',')[0].strip())
+    except ValueError:
+        return cpu_count
+    return max(1, min(n_jobs, cpu_count))
+
+
+class TrainingBudget:
+    """Budget de temps (ms) et de coeurs pour l'entraînement d'un modèle"""
+
+    def __init__(self, time_budget_ms=DEFAULT_TIME_BUDGET_MS, cpu_budget=None):
+        cpu_count = os.cpu_count() or 1
+        self.time_budget_ms = max(1, min(int(time_budget_ms), MAX_TIME_BUDGET_MS))
+        self.n_jobs = max(1, min(int(cpu_budget), cpu_count)) if cpu_budget else default_n_jobs(cpu_count)
+        self._start = None
+
+    @classmethod
+    def from_request_args(cls, args):
+        """Construit le budget depuis les paramètres `budget_ms` et `cpu` de la requête"""
+        try:
+            time_budget_ms = int(args.get('budget_ms', DEFAULT_TIME_BUDGET_MS))
+            cpu_budget = int(args['cpu']) if args.get('cpu') else None
+        except ValueError:
+            raise ValueError("Les paramètres 'budget_ms' et 'cpu' doivent être des entiers")
+        return cls(time_budget_ms, cpu_budget)
+
+    def start(self):
+        self._start = time.perf_counter()
+        return self
+
+    def elapsed_ms(self):
+        if self._start is None:
+            return 0.0
+        return (time.perf_counter() - self._start) * 1000
+
+    def remaining_ms(self):
+        return self.time_budget_ms - self.elapsed_ms()
+
+    def exhausted(self):
+        return self.remaining_ms() <= 0
+
+    def sub_budget(self):
+        """
+        Budget d'un modèle pris sur ce budget (déjà démarré): le temps restant
+        et les mêmes coeurs. Le premier pas d'un entraînement est toujours fait,
+        même sur un budget épuisé.
+        """
+        return TrainingBudget(self.remaining_ms(), self.n_jobs)
+
+    def report(self, **details):
+        report = {
+            'time_budget_ms': self.time_budget_ms,
+            'time_used_ms': round(self.elapsed_ms(), 1),
+            'n_jobs': self.n_jobs
+        }
+        report.update(details)
+        return report
+
+
+def fit_forest_within_budget(X_train, y_train, budget, max_estimators=100, step=10,
+                             tol=0.002, patience=2, **params):
+    """
+    Entraîne une RandomForestClassifier par paliers de `step` arbres (warm start)
+    jusqu'à `max_estimators`, jusqu'à convergence du score out-of-bag (gain
+    inférieur à `tol` pendant `patience` paliers) ou jusqu'à épuisement du budget.
+    Retourne le modèle et le rapport du budget.
+    """
+    budget.start()
+
+    # Poids de classes explicites: le preset 'balanced' n'est pas recommandé avec warm_start
+    classes = np.unique(y_train)
+    weights = compute_class_weight('balanced', classes=classes, y=y_train)
+    class_weight = dict(zip(classes, weights))
+
+    model = RandomForestClassifier(
+        n_estimators=0,
+        warm_start=True,
+        oob_score=True,
+        n_jobs=budget.n_jobs,
+        class_weight=class_weight,
+        **params
+    )
+
+    best_score = -np.inf
+    stalled = 0
+    stop_reason = 'max_estimators'
+    while model.n_estimators < max_estimators:
+        step_start = time.perf_counter()
+        model.n_estimators = min(model.n_estimators + step, max_estimators)
+        with warnings.catch_warnings():
+            # Attendu sur les premiers paliers: certains jeux n'ont pas encore de score OOB
+            warnings.filterwarnings('ignore', message='Some inputs do not have OOB scores')
+            model.fit(X_train, y_train)
+        step_ms = (time.perf_counter() - step_start) * 1000
+
+        if model.oob_score_ > best_score + tol:
+            best_score = model.oob_score_
+            stalled = 0
+        else:
+            stalled += 1
+        if stalled >= patience:
+            stop_reason = 'converged'
+            break
+        # Ne pas commencer un palier qui dépasserait le budget
+        if budget.remaining_ms() < step_ms:
+            stop_reason = 'budget'
+            break
+
+    return model, budget.report(
+        n_estimators=int(model.n_estimators),
+        oob_score=float(model.oob_score_),
+        stop_reason=stop_reason
+    )
+
+
+class TimeBudgetCallback(xgb.callback.TrainingCallback):
+    """Arrête le boosting dès que le budget de temps est épuisé"""
+
+    def __init__(self, budget):
+        super().__init__()
+        self.budget = budget
+        self.triggered = False
+
+    def after_iteration(self, model, epoch, evals_log):
+        if self.budget.exhausted():
+            self.triggered = True
+            return True
+        return False
+
+
+def fit_boosting_within_budget(X_train, y_train, budget, max_rounds=100,
+                               early_stopping_rounds=10, validation_fraction=0.2, **params):
+    """
+    Entraîne un XGBRegressor avec early stopping sur une fraction de validation
+    prise dans le jeu d'entraînement, arrêté au plus tard à l'épuisement du budget.
+    La méthode d'arbre et le nombre de threads sont choisis selon la taille des
+    données et le budget. Retourne le modèle et le rapport du budget.
+    """
+    budget.start()
+
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        X_train, y_train, test_size=validation_fraction, random_state=42
+    )
+    tree_method = 'exact' if len(X_fit) <= EXACT_TREE_METHOD_MAX_ROWS else 'hist'
+    time_callback = TimeBudgetCallback(budget)
+
+    model = xgb.XGBRegressor(
+        n_estimators=max_rounds,
+        tree_method=tree_method,
+        n_jobs=budget.n_jobs,
+        early_stopping_rounds=early_stopping_rounds,
+        callbacks=[time_callback],
+        **params
+    )
+    model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+
+    rounds = int(model.get_booster().num_boosted_rounds())
+    try:
+        best_iteration = int(model.best_iteration)
+    except AttributeError:
+        # Budget épuisé avant que l'early stopping n'ait évalué une itération
+        best_iteration = rounds - 1
+    if time_callback.triggered:
+        stop_reason = 'budget'
+    elif rounds < max_rounds:
+        stop_reason = 'early_stopping'
+    else:
+        stop_reason = 'max_rounds'
+
+    return model, budget.report(
+        tree_method=tree_method,
+        boosting_rounds=rounds,
+        best_iteration=best_iteration,
+        stop_reason=stop_reason
+    )
+
+
+def fit_kmeans_within_budget(X, n_clusters, budget, n_init=10, random_state=42):
+    """
+    K-Means avec au plus `n_init` initialisations, lancées une par une: la
+    meilleure inertie est gardée, et une initialisation n'est pas commencée
+    si le temps restant ne suffit pas à la terminer (la première est toujours
+    faite). Retourne le modèle et le rapport du budget.
+    """
+    budget.start()
+
+    seeds = np.random.RandomState(random_state).randint(np.iinfo(np.int32).max, size=n_init)
+    best_model = None
+    runs = 0
+    stop_reason = 'n_init'
+    for seed in seeds:
+        run_start = time.perf_counter()
+        model = KMeans(n_clusters=n_clusters, random_state=seed, n_init=1).fit(X)
+        run_ms = (time.perf_counter() - run_start) * 1000
+        runs += 1
+        if best_model is None or model.inertia_ < best_model.inertia_:
+            best_model = model
+        if runs < n_init and budget.remaining_ms() < run_ms:
+            stop_reason = 'budget'
+            break
+
+    return best_model, budget.report(
+        n_init=runs,
+        inertia=float(best_model.inertia_),
+        stop_reason=stop_reason
+    )